@@ -0,0 +1,305 @@
+"""Record agent sessions and replay them offline for performance regression checks.
+
+Recording: set AGENT_RECORD_DIR and every /ask writes the LangGraph event
+stream it consumed (messages, tool calls and arrival times) to a JSON
+fixture in that directory. `python agent_replay.py record "message"` does
+the same for a single message against the real backends. Recordings
+contain the user's message, so only enable this with test accounts.
+
+Replay: `python agent_replay.py replay FIXTURES...` runs each recording
+through the real agent graph and parse_response, with the Groq model and
+the tools replaced by fakes that return the recorded outputs after the
+recorded latencies. It prints per-stage timings and, with --baseline,
+the difference from an earlier replay run saved with --save.
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+import uuid
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import StructuredTool
+from pydantic import PrivateAttr
+
+FIXTURE_VERSION = 1
+
+
+# Recording
+
+def _serialize_event(event: dict, offset: float) -> dict:
+    node, update = next(iter(event.items()))
+    messages = update.get("messages", []) if isinstance(update, dict) else []
+    return {"t": round(offset, 6), "node": node, "messages": messages_to_dict(messages)}
+
+
+async def record_stream(stream, message: str, system_prompt: str, record_dir: str):
+    """Pass an agent event stream through unchanged while recording it to a fixture"""
+    events = []
+    started = time.perf_counter()
+
+    async for event in stream:
+        events.append(_serialize_event(event, time.perf_counter() - started))
+        yield event
+
+    fixture = {
+        "version": FIXTURE_VERSION,
+        "recorded_at": datetime.utcnow().isoformat(),
+        "message": message,
+        "system_prompt": system_prompt,
+        "total_s": round(time.perf_counter() - started, 6),
+        "events": events,
+    }
+    # Serializing and writing can take a while for long sessions; keep it off the event loop
+    await asyncio.to_thread(_write_fixture, fixture, record_dir)
+
+
+def _write_fixture(fixture: dict, record_dir: str) -> str:
+    os.makedirs(record_dir, exist_ok=True)
+    path = os.path.join(record_dir, f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, indent=2)
+    return path
+
+
+def load_fixture(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    if fixture.get("version") != FIXTURE_VERSION:
+        raise ValueError(f"{path}: unsupported fixture version {fixture.get('version')}")
+    return fixture
+
+
+def recorded_stages(fixture: dict) -> List[dict]:
+    """Stage durations implied by event arrival times.
+
+    Each event ends a stage that started when the previous agent step
+    finished; parallel tool events all start at the same agent step.
+    """
+    events = fixture["events"]
+    stages = []
+    counts = defaultdict(int)
+    step_started = 0.0
+
+    for index, event in enumerate(events):
+        counts[event["node"]] += 1
+        stages.append({
+            "stage": f"{event['node']}#{counts[event['node']]}",
+            "seconds": event["t"] - step_started,
+        })
+        # The next agent step starts once the last tool of this step is done
+        next_node = events[index + 1]["node"] if index + 1 < len(events) else None
+        if event["node"] != "tools" or next_node != "tools":
+            step_started = event["t"]
+    return stages
+
+
+# Replay fakes
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model that returns recorded AI messages after their recorded latency"""
+
+    _responses: deque = PrivateAttr()
+
+    def __init__(self, responses: List[tuple], **kwargs):
+        super().__init__(**kwargs)
+        self._responses = deque(responses)
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _next(self) -> tuple:
+        if not self._responses:
+            raise RuntimeError("Replay ran more model calls than were recorded")
+        return self._responses.popleft()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message, delay = self._next()
+        time.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        message, delay = self._next()
+        await asyncio.sleep(delay)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _replay_tool(name: str, outputs: deque, template: Any) -> StructuredTool:
+    async def run(**kwargs):
+        content, delay = outputs.popleft()
+        await asyncio.sleep(delay)
+        return content
+
+    return StructuredTool.from_function(
+        coroutine=run,
+        name=name,
+        description=getattr(template, "description", name),
+        args_schema=getattr(template, "args_schema", None),
+    )
+
+
+def build_replay_graph(fixture: dict, speed: float = 1.0):
+    """Agent graph wired like ai_agent.get_graph(), backed by the recording"""
+    from langgraph.prebuilt import create_react_agent
+    from ai_agent import tools as real_tools
+
+    responses = []
+    tool_outputs = defaultdict(deque)
+    stages = iter(recorded_stages(fixture))
+
+    for event in fixture["events"]:
+        delay = next(stages)["seconds"] * speed
+        messages = messages_from_dict(event["messages"])
+        if event["node"] == "tools":
+            for msg in messages:
+                tool_outputs[msg.name].append((msg.content, delay))
+        else:
+            ai_messages = [m for m in messages if isinstance(m, AIMessage)]
+            if ai_messages:
+                responses.append((ai_messages[-1], delay))
+
+    templates = {t.name: t for t in real_tools}
+    fake_tools = [_replay_tool(name, outputs, templates.get(name)) for name, outputs in tool_outputs.items()]
+    for name, template in templates.items():
+        if name not in tool_outputs:
+            fake_tools.append(_replay_tool(name, deque(), template))
+
+    return create_react_agent(ReplayChatModel(responses), tools=fake_tools)
+
+
+async def replay_fixture(fixture: dict, speed: float = 1.0) -> dict:
+    """Run one recording through the agent pipeline and time each stage"""
+    from ai_agent import aparse_response
+
+    graph = build_replay_graph(fixture, speed)
+    inputs = {"messages": [("system", fixture["system_prompt"]), ("user", fixture["message"])]}
+
+    replayed = {"events": []}
+    started = time.perf_counter()
+
+    async def timed_stream():
+        async for event in graph.astream(inputs, stream_mode="updates"):
+            replayed["events"].append(_serialize_event(event, time.perf_counter() - started))
+            yield event
+
+    tool_used, response = await aparse_response(timed_stream())
+    total = time.perf_counter() - started
+
+    recorded = recorded_stages(fixture)
+    replayed_stages = recorded_stages(replayed)
+    stages = []
+    for rec, rep in zip(recorded, replayed_stages):
+        stages.append({
+            "stage": rec["stage"],
+            "recorded_ms": round(rec["seconds"] * speed * 1000, 1),
+            "replayed_ms": round(rep["seconds"] * 1000, 1),
+        })
+
+    return {
+        "tool_used": tool_used,
+        "response_matches": response == _recorded_response(fixture),
+        "recorded_total_ms": round(fixture["total_s"] * speed * 1000, 1),
+        "replayed_total_ms": round(total * 1000, 1),
+        "stages": stages,
+    }
+
+
+def _recorded_response(fixture: dict) -> Optional[str]:
+    response = None
+    for event in fixture["events"]:
+        if event["node"] == "agent":
+            for msg in messages_from_dict(event["messages"]):
+                if msg.content:
+                    response = msg.content
+    return response
+
+
+# CLI
+
+def _print_report(name: str, result: dict, baseline: Optional[dict]) -> None:
+    print(f"\n{name}  tools={result['tool_used']}  response_matches={result['response_matches']}")
+    header = f"  {'stage':<12} {'recorded ms':>12} {'replayed ms':>12} {'overhead ms':>12}"
+    if baseline:
+        header += f" {'vs baseline ms':>15}"
+    print(header)
+
+    base_stages = {s["stage"]: s for s in baseline["stages"]} if baseline else {}
+    rows = result["stages"] + [{
+        "stage": "total",
+        "recorded_ms": result["recorded_total_ms"],
+        "replayed_ms": result["replayed_total_ms"],
+    }]
+    if baseline:
+        base_stages["total"] = {"replayed_ms": baseline["replayed_total_ms"]}
+
+    for stage in rows:
+        line = (f"  {stage['stage']:<12} {stage['recorded_ms']:>12.1f} {stage['replayed_ms']:>12.1f} "
+                f"{stage['replayed_ms'] - stage['recorded_ms']:>12.1f}")
+        if baseline and stage["stage"] in base_stages:
+            line += f" {stage['replayed_ms'] - base_stages[stage['stage']]['replayed_ms']:>+15.1f}"
+        print(line)
+
+
+async def replay_command(args):
+    paths = []
+    for pattern in args.fixtures:
+        paths.extend(sorted(glob.glob(os.path.join(pattern, "*.json"))) if os.path.isdir(pattern) else [pattern])
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results = {}
+    for path in paths:
+        name = os.path.basename(path)
+        results[name] = await replay_fixture(load_fixture(path), speed=args.speed)
+        _print_report(name, results[name], baseline.get(name))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+async def record_command(args):
+    from ai_agent import get_graph, SYSTEM_PROMPT, aparse_response
+
+    inputs = {"messages": [("system", SYSTEM_PROMPT), ("user", args.message)]}
+    stream = record_stream(get_graph().astream(inputs, stream_mode="updates"), args.message, SYSTEM_PROMPT, args.dir)
+    tool_used, response = await aparse_response(stream)
+    print(f"TOOL CALLED: {tool_used}\nANSWER: {response}\nRecording written to {args.dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay agent sessions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record = subparsers.add_parser("record", help="Run one message against the real agent and record it")
+    record.add_argument("message")
+    record.add_argument("--dir", default=os.getenv("AGENT_RECORD_DIR") or "recordings")
+    record.set_defaults(func=record_command)
+
+    replay = subparsers.add_parser("replay", help="Replay recordings with faked backends")
+    replay.add_argument("fixtures", nargs="+", help="Fixture files or directories")
+    replay.add_argument("--speed", type=float, default=1.0, help="Scale recorded latencies (e.g. 0.1)")
+    replay.add_argument("--save", help="Write replay timings to this JSON file")
+    replay.add_argument("--baseline", help="Compare against timings saved by an earlier run")
+    replay.set_defaults(func=replay_command)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,60 @@
+import asyncio
+import logging
+from functools import wraps
 from langchain_core.tools import tool
-from tools import query_medgemma, call_emergency
+from tools import aquery_medgemma, acall_emergency, MEDGEMMA_FALLBACK
+from message_metrics import current_metrics
+from config import (
+    SPECIALIST_TOOL_TIMEOUT_SECONDS,
+    EMERGENCY_TOOL_TIMEOUT_SECONDS,
+    THERAPIST_TOOL_TIMEOUT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+
+def with_timeout(seconds: float, fallback: str):
+    """Bound an async tool's run time, answering with a fallback message on timeout.
+
+    Tools are async so that the agent's tool node runs several calls from the
+    same step concurrently; the timeout keeps one slow backend from holding up the rest.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await asyncio.wait_for(func(*args, **kwargs), timeout=seconds)
+            except asyncio.TimeoutError:
+                logger.warning("Tool %s timed out after %ss", func.__name__, seconds)
+                return fallback
+        return wrapper
+    return decorator
+
 
 @tool
-def ask_mental_health_specialist(query: str) -> str:
+@with_timeout(SPECIALIST_TOOL_TIMEOUT_SECONDS, MEDGEMMA_FALLBACK)
+async def ask_mental_health_specialist(query: str) -> str:
     """
     Generate a therapeutic response using the MedGemma model.
     Use this for all general user queries, mental health questions, emotional concerns,
     or to offer empathetic, evidence-based guidance in a conversational tone.
     """
-    return query_medgemma(query)
+    return await aquery_medgemma(query)
 
 
 @tool
-def emergency_call_tool() -> None:
+@with_timeout(EMERGENCY_TOOL_TIMEOUT_SECONDS, "Emergency call could not be confirmed in time. Please contact local emergency services directly.")
+async def emergency_call_tool() -> None:
     """
     Place an emergency call to the safety helpline's phone number via Twilio.
     Use this only if the user expresses suicidal ideation, intent to self-harm,
     or describes a mental health emergency requiring immediate help.
     """
-    return call_emergency()
+    return await acall_emergency()
 
 @tool
-def find_nearby_therapists_by_location(location: str) -> str:
+@with_timeout(THERAPIST_TOOL_TIMEOUT_SECONDS, "I couldn't look up therapists right now. Please try again shortly.")
+async def find_nearby_therapists_by_location(location: str) -> str:
     """
     Finds and returns a list of licensed therapists near the specified location.
 
@@ -40,14 +73,32 @@ def find_nearby_therapists_by_location(location: str) -> str:
 
 # Creating Agents
 
-from langchain_groq import ChatGroq
-from langgraph.prebuilt import create_react_agent
+from functools import lru_cache
 from config import GROQ_API_KEY
 
 tools = [ask_mental_health_specialist, emergency_call_tool, find_nearby_therapists_by_location]
 
-llm = ChatGroq(model="openai/gpt-oss-120b", temperature=0.2, api_key=GROQ_API_KEY)
-graph = create_react_agent(llm, tools=tools)
+
+@lru_cache(maxsize=1)
+def get_graph():
+    """Build the agent graph on first use; langchain_groq and langgraph are imported here"""
+    from langchain_groq import ChatGroq
+    from langgraph.prebuilt import create_react_agent
+
+    llm = ChatGroq(model="openai/gpt-oss-120b", temperature=0.2, api_key=GROQ_API_KEY)
+    return create_react_agent(llm, tools=tools)
+
+
+def warm_up():
+    """Build the graph and tool clients ahead of the first request (per worker process)"""
+    from tools import get_twilio_client
+    from llm_pool import get_provider_pool
+    from config import TWILIO_ACCOUNT_SID
+
+    get_graph()
+    get_provider_pool()
+    if TWILIO_ACCOUNT_SID:
+        get_twilio_client()
 
 
 
@@ -61,40 +112,80 @@ You have access to three tools:
 2. `find_nearby_therapists_by_location`: Use this tool if the user asks about nearby therapists or if recommending local professional help would be beneficial.
 3. `emergency_call_tool`: Use this immediately if the user expresses suicidal thoughts, self-harm intentions, or is in crisis.
 
+In a crisis, call `emergency_call_tool` and `ask_mental_health_specialist` together in the same step.
+
 Always take necessary action. Respond kindly, clearly, and supportively.
 """
 
 
-def parse_response(stream):
-    tool_called_name = "None"
-    final_response = None
-
-    for s in stream:
-        # Debugging: print har ek chunk
-        print("STREAM EVENT:", s)
+def _summarize_event(s) -> dict:
+    """Shape of a stream event (nodes, message types, tool calls, sizes) without its text"""
+    summary = {}
+    for node, update in s.items():
+        messages = update.get("messages", []) if isinstance(update, dict) else []
+        summary[node] = [
+            {
+                "type": getattr(msg, "type", type(msg).__name__),
+                "name": getattr(msg, "name", None),
+                "tool_calls": [call["name"] for call in getattr(msg, "tool_calls", None) or []],
+                "chars": len(str(getattr(msg, "content", ""))),
+            }
+            for msg in messages
+        ]
+    return summary
+
+
+def _handle_stream_event(s, state):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Agent stream event", extra={"event": _summarize_event(s)})
+
+    # --- Tool check ---
+    # Parallel tool calls may arrive in one event or one event per call
+    if "tool" in s:
+        tool_event = s["tool"]
+        if isinstance(tool_event, dict):
+            names = [tool_event.get("name", "None")]
+            state["tools"].extend(n for n in names if n not in state["tools"])
+
+    elif "tools" in s:  # fallback
+        tool_data = s["tools"]
+        if isinstance(tool_data, dict):
+            # kuch versions me tool name directly hota hai
+            names = [msg.name for msg in tool_data.get("messages", []) if getattr(msg, "name", None)]
+            if not names and "name" in tool_data:
+                names = [tool_data["name"]]
+            state["tools"].extend(n for n in names if n not in state["tools"])
+
+    # --- Agent response check ---
+    if "agent" in s:
+        agent_data = s["agent"]
+        messages = agent_data.get("messages", [])
+        if messages and isinstance(messages, list):
+            metrics = current_metrics()
+            for msg in messages:
+                if metrics:
+                    metrics.add_groq_message(msg)
+                if hasattr(msg, "content") and msg.content:
+                    state["response"] = msg.content
+
+
+def _parse_result(state):
+    return ", ".join(state["tools"]) or "None", state["response"]
 
-        # --- Tool check ---
-        if "tool" in s:
-            tool_event = s["tool"]
-            if isinstance(tool_event, dict):
-                tool_called_name = tool_event.get("name", "None")
 
-        elif "tools" in s:  # fallback
-            tool_data = s["tools"]
-            if isinstance(tool_data, dict):
-                # kuch versions me tool name directly hota hai
-                tool_called_name = tool_data.get("name", "None")
+def parse_response(stream):
+    state = {"tools": [], "response": None}
+    for s in stream:
+        _handle_stream_event(s, state)
+    return _parse_result(state)
 
-        # --- Agent response check ---
-        if "agent" in s:
-            agent_data = s["agent"]
-            messages = agent_data.get("messages", [])
-            if messages and isinstance(messages, list):
-                for msg in messages:
-                    if hasattr(msg, "content") and msg.content:
-                        final_response = msg.content
 
-    return tool_called_name, final_response
+async def aparse_response(stream):
+    """parse_response for graph.astream(); tools are async so /ask uses this"""
+    state = {"tools": [], "response": None}
+    async for s in stream:
+        _handle_stream_event(s, state)
+    return _parse_result(state)
 
 
 
@@ -104,7 +195,7 @@ def parse_response(stream):
 #         user_input = input("User: ")
 #         print(f"Received user input: {user_input[:200]}...")
 #         inputs = {"messages": [("system", SYSTEM_PROMPT), ("user", user_input)]}
-#         stream = graph.stream(inputs, stream_mode="updates")
+#         stream = get_graph().stream(inputs, stream_mode="updates")
 #         tool_called_name, final_response = parse_response(stream)
 #         print("TOOL CALLED: ", tool_called_name)
 #         print("ANSWER: ", final_response)
@@ -0,0 +1,32 @@
+import asyncio
+import logging
+
+from config import CHAT_ARCHIVE_INTERVAL_SECONDS
+from database import archive_chat_history
+from shared_state import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+
+async def run_archiver(interval_seconds: int = CHAT_ARCHIVE_INTERVAL_SECONDS) -> None:
+    """Periodically move chat history past the retention window into the archive.
+
+    Every worker runs this loop, but only the holder of the archiver lease does the work.
+    """
+    store = get_shared_store()
+    while True:
+        try:
+            if await asyncio.to_thread(store.acquire_lease, "chat-archiver", ttl=2 * interval_seconds):
+                archived = await asyncio.to_thread(archive_chat_history)
+                if archived:
+                    logger.info("Archived %d chat history rows", archived)
+        except Exception:
+            logger.exception("Chat history archival failed")
+        await asyncio.sleep(interval_seconds)
+
+
+def start_archiver() -> asyncio.Task | None:
+    """Start the background archiver unless it is disabled (interval of 0)"""
+    if CHAT_ARCHIVE_INTERVAL_SECONDS <= 0:
+        return None
+    return asyncio.create_task(run_archiver())
@@ -16,6 +16,9 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
 
+# Comma-separated emails allowed to use admin endpoints (global metrics, ...)
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt (max 72 bytes)"""
     # ALWAYS truncate to 72 bytes to prevent bcrypt errors
@@ -66,3 +69,13 @@ def verify_token(token: str) -> dict:
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """Dependency to get current authenticated user"""
     return verify_token(credentials.credentials)
+
+
+def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """Dependency that only lets users listed in ADMIN_EMAILS through"""
+    if current_user["email"].lower() not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required"
+        )
+    return current_user
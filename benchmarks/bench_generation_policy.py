@@ -0,0 +1,114 @@
+"""Compare fixed and adaptive MedGemma token budgets against a fake Ollama.
+
+The fake endpoint decodes at a fixed rate and would happily write a long
+answer to every message, like the real model tends to. For a mix of short
+acknowledgements, questions and disclosures the benchmark reports the
+latency and tokens generated vs. kept with the fixed 350-token budget and
+with the adaptive policy.
+
+Usage:
+    python benchmarks/bench_generation_policy.py [--tokens-per-s 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tools  # noqa: E402
+from generation_policy import GenerationPolicy  # noqa: E402
+from llm_pool import ProviderPool  # noqa: E402
+
+MESSAGES = [
+    "thanks",
+    "ok, that helps",
+    "How can I sleep better when my mind keeps racing?",
+    "What is grounding?",
+    "I've been feeling really low for weeks. Work is overwhelming, I barely talk to my friends "
+    "anymore and I keep lying awake replaying every mistake I made during the day. I don't know "
+    "how to get out of this and I'm tired of pretending everything is fine.",
+    "My partner and I argue constantly and I feel like I'm always the one apologising.",
+]
+
+SENTENCE = "That sounds really hard, and it makes sense that you feel this way right now."
+NATURAL_TOKENS = 420  # What the model writes when nothing stops it
+
+
+class FakeStreamingOllama:
+    def __init__(self, host, tokens_per_s):
+        self.delay = 1 / tokens_per_s
+
+    async def list(self):
+        return {"models": []}
+
+    async def create(self, **kwargs):
+        pass
+
+    def _tokens(self, limit):
+        words = (SENTENCE + " ") * (NATURAL_TOKENS // len(SENTENCE.split()) + 1)
+        return [w + " " for w in words.split()][:limit]
+
+    async def chat(self, model, messages, options=None, keep_alive=None, stream=False):
+        limit = min((options or {}).get("num_predict", NATURAL_TOKENS), NATURAL_TOKENS)
+        tokens = self._tokens(limit)
+        reason = "length" if limit < NATURAL_TOKENS else "stop"
+
+        async def generate():
+            start = time.perf_counter()
+            for token in tokens:
+                await asyncio.sleep(self.delay)
+                yield {"message": {"content": token}, "done": False}
+            yield {
+                "message": {"content": ""}, "done": True, "done_reason": reason,
+                "eval_count": len(tokens), "eval_duration": int((time.perf_counter() - start) * 1e9),
+                "prompt_eval_duration": 0,
+            }
+
+        if stream:
+            return generate()
+        final = None
+        async for part in generate():
+            final = part
+        return {**final, "message": {"content": "".join(tokens)}}
+
+
+async def run(policy: GenerationPolicy, pool: ProviderPool) -> dict:
+    tools.get_provider_pool = lambda: pool
+    tools.get_generation_policy = lambda: policy
+
+    start = time.perf_counter()
+    for message in MESSAGES:
+        await tools.aquery_medgemma(message)
+    elapsed = time.perf_counter() - start
+
+    stats = policy.summary()["intents"].values()
+    return {
+        "seconds": elapsed,
+        "budget": sum(s["budget"] for s in stats),
+        "generated": sum(s["generated"] for s in stats),
+        "used": sum(s["used"] for s in stats),
+    }
+
+
+async def main(args):
+    pool = ProviderPool(["fake"], client_factory=lambda host: FakeStreamingOllama(host, args.tokens_per_s))
+    fixed = await run(GenerationPolicy(enabled=False), pool)
+    adaptive_policy = GenerationPolicy(enabled=True)
+    adaptive = await run(adaptive_policy, pool)
+
+    print(f"{'policy':<10} {'seconds':>8} {'budget':>7} {'generated':>10} {'used':>6}")
+    for name, r in (("fixed", fixed), ("adaptive", adaptive)):
+        print(f"{name:<10} {r['seconds']:>8.2f} {r['budget']:>7} {r['generated']:>10} {r['used']:>6}")
+
+    print("\nadaptive by intent:")
+    for intent, s in adaptive_policy.summary()["intents"].items():
+        print(f"  {intent:<16} calls={s['calls']} budget={s['budget']} generated={s['generated']} "
+              f"used={s['used']} early_stops={s['early_stops']} truncated={s['truncated']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens-per-s", type=float, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,112 @@
+"""Microbenchmark for /chat/history serialization at 1k and 10k rows.
+
+Compares the previous path (ORM objects -> dicts with isoformat() -> FastAPI
+jsonable_encoder -> json) with the current one (column rows -> dicts -> orjson).
+
+Usage:
+    python benchmarks/bench_history_serialization.py [--sizes 1000 10000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Point the app at a throwaway database before importing it
+_tmpdir = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+os.environ["CHAT_ZSTD_DICT_DIR"] = os.path.join(_tmpdir, "zstd_dicts")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+import database  # noqa: E402
+from database import ChatHistoryDB, SessionLocal, get_user_chat_history, init_db  # noqa: E402
+from fastapi.responses import ORJSONResponse  # noqa: E402
+
+MESSAGE = "I've been feeling anxious about work lately and I can't sleep well. "
+RESPONSE = (
+    "I can sense how difficult this must be for you. Many people feel this way when "
+    "pressure builds up at work, and sleep is often the first thing to suffer. "
+) * 4
+
+
+def seed(user_id: str, rows: int) -> None:
+    db = SessionLocal()
+    now = datetime.utcnow()
+    try:
+        db.add_all([
+            ChatHistoryDB(
+                id=str(uuid.uuid4()),
+                user_id=user_id,
+                message=MESSAGE,
+                response=RESPONSE,
+                tool_used="ask_mental_health_specialist",
+                created_at=now - timedelta(seconds=i)
+            )
+            for i in range(rows)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def legacy_history(user_id: str) -> bytes:
+    db = SessionLocal()
+    try:
+        entries = db.query(ChatHistoryDB).filter(
+            ChatHistoryDB.user_id == user_id
+        ).order_by(ChatHistoryDB.created_at.desc()).all()
+        history = []
+        for entry in entries:
+            history.append({
+                "id": entry.id,
+                "message": entry.message,
+                "response": entry.response,
+                "tool_used": entry.tool_used,
+                "created_at": entry.created_at.isoformat()
+            })
+    finally:
+        db.close()
+    return json.dumps(jsonable_encoder({"history": history})).encode("utf-8")
+
+
+def current_history(user_id: str) -> bytes:
+    return ORJSONResponse({"history": get_user_chat_history(user_id)}).body
+
+
+def timed(func, user_id: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(user_id)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /chat/history serialization")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    init_db()
+    print(f"{'rows':>8} {'legacy ms':>10} {'current ms':>11} {'speedup':>8}")
+    for size in args.sizes:
+        user_id = f"bench-{size}"
+        seed(user_id, size)
+        legacy = timed(legacy_history, user_id, args.repeat)
+        current = timed(current_history, user_id, args.repeat)
+        print(f"{size:>8} {legacy * 1000:>10.1f} {current * 1000:>11.1f} {legacy / current:>7.1f}x")
+
+    database.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Balance MedGemma calls across fake Ollama endpoints.
+
+Each fake endpoint serves a limited number of requests at a time with a
+fixed latency, like one GPU box. The benchmark compares throughput with
+one endpoint against the whole pool, then takes one endpoint down half way
+through a run to show it being ejected and re-admitted by health checks.
+
+Usage:
+    python benchmarks/bench_llm_pool.py [--endpoints 3] [--requests 60] [--concurrency 12]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_pool import ProviderPool  # noqa: E402
+
+LATENCY = 0.2   # seconds per generation
+SLOTS = 2       # concurrent generations per endpoint
+
+
+class FakeOllama:
+    """Stand-in for ollama.AsyncClient with a fixed latency and capacity"""
+
+    def __init__(self, host):
+        self.host = host
+        self.down = False
+        self._slots = asyncio.Semaphore(SLOTS)
+
+    async def _check(self):
+        if self.down:
+            raise ConnectionError(f"{self.host} is down")
+
+    async def list(self):
+        await self._check()
+        return {"models": []}
+
+    async def create(self, **kwargs):
+        await self._check()
+
+    async def chat(self, model, messages, **kwargs):
+        await self._check()
+        async with self._slots:
+            await asyncio.sleep(LATENCY)
+        return {"message": {"content": f"answer from {self.host}"}, "eval_count": 50}
+
+
+async def run_load(pool: ProviderPool, requests: int, concurrency: int) -> float:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with limit:
+            await pool.call(lambda e: e.client.chat(model="m", messages=[{"role": "user", "content": str(i)}]))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)), return_exceptions=True)
+    return time.perf_counter() - start
+
+
+def print_stats(pool: ProviderPool) -> None:
+    print(f"  {'host':<10} {'requests':>8} {'failures':>8} {'peak':>5} {'ejections':>9} {'avg ms':>7} available")
+    for s in pool.stats():
+        print(f"  {s['host']:<10} {s['requests']:>8} {s['failures']:>8} {s['peak_outstanding']:>5} "
+              f"{s['ejections']:>9} {s['avg_latency_ms'] or 0:>7.0f} {s['available']}")
+
+
+async def main(args):
+    hosts = [f"fake-{i}" for i in range(args.endpoints)]
+
+    single = ProviderPool(hosts[:1], client_factory=FakeOllama)
+    elapsed = await run_load(single, args.requests, args.concurrency)
+    print(f"1 endpoint:  {args.requests / elapsed:6.1f} req/s")
+
+    pool = ProviderPool(hosts, client_factory=FakeOllama)
+    elapsed = await run_load(pool, args.requests, args.concurrency)
+    print(f"{args.endpoints} endpoints: {args.requests / elapsed:6.1f} req/s")
+    print_stats(pool)
+
+    # Failover: one endpoint dies, health checks eject it, it comes back and is re-admitted
+    pool = ProviderPool(hosts, client_factory=FakeOllama, eject_seconds=0.5)
+    victim = pool.endpoints[0]
+    checker = asyncio.create_task(pool.run_health_checks(interval_seconds=0.1))
+
+    load = asyncio.create_task(run_load(pool, args.requests * 2, args.concurrency))
+    await asyncio.sleep(0.3)
+    victim.client.down = True
+    await asyncio.sleep(0.3)
+    ejected = not victim.available(time.monotonic())
+    victim.client.down = False
+    await asyncio.sleep(0.8)
+    readmitted = victim.available(time.monotonic())
+    await load
+    checker.cancel()
+
+    print(f"\nFailover: ejected={ejected} readmitted={readmitted}")
+    print_stats(pool)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoints", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=12)
+    asyncio.run(main(parser.parse_args()))
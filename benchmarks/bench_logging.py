@@ -0,0 +1,83 @@
+"""Request-path cost of a log call: synchronous stdout handler vs the queue pipeline.
+
+Records go to a sink that takes --write-us microseconds per write, like a
+congested stdout pipe. The synchronous handler makes the caller pay for
+every write; with the queue handler the caller only pays for the enqueue,
+and when the writer falls too far behind records are dropped and counted.
+
+Usage:
+    python benchmarks/bench_logging.py [--records 20000] [--write-us 50]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logging_setup import DrainingQueueListener, JsonFormatter, NonBlockingQueueHandler  # noqa: E402
+
+
+class SlowSink:
+    def __init__(self, write_us: float):
+        self.delay = write_us / 1e6
+        self.lines = 0
+
+    def write(self, text):
+        time.sleep(self.delay)
+        self.lines += 1
+
+    def flush(self):
+        pass
+
+
+def measure(logger: logging.Logger, records: int) -> list:
+    timings = []
+    for i in range(records):
+        start = time.perf_counter_ns()
+        logger.info("Tool %s finished in %d ms", "ask_mental_health_specialist", i % 900, extra={"prompt": "x" * 200})
+        timings.append((time.perf_counter_ns() - start) / 1000)
+    return timings
+
+
+def report(name: str, timings: list, extra: str = "") -> None:
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99)]
+    print(f"{name:<12} mean={statistics.mean(timings):8.1f}us p50={timings[len(timings) // 2]:8.1f}us "
+          f"p99={p99:8.1f}us {extra}")
+
+
+def main(args):
+    sync_logger = logging.getLogger("bench.sync")
+    sync_logger.propagate = False
+    sync_handler = logging.StreamHandler(SlowSink(args.write_us))
+    sync_handler.setFormatter(JsonFormatter())
+    sync_logger.addHandler(sync_handler)
+    sync_logger.setLevel(logging.INFO)
+    report("sync", measure(sync_logger, args.records))
+
+    queue_logger = logging.getLogger("bench.queue")
+    queue_logger.propagate = False
+    queue_handler = NonBlockingQueueHandler(args.queue_size)
+    queue_logger.addHandler(queue_handler)
+    queue_logger.setLevel(logging.INFO)
+
+    sink = SlowSink(args.write_us)
+    writer = logging.StreamHandler(sink)
+    writer.setFormatter(JsonFormatter())
+    listener = DrainingQueueListener(queue_handler.queue, writer)
+    listener.start()
+    timings = measure(queue_logger, args.records)
+    listener.stop()
+    stats = queue_handler.stats()
+    report("queue", timings, f"written={sink.lines} dropped={stats['dropped']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--write-us", type=float, default=50)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    main(parser.parse_args())
@@ -0,0 +1,86 @@
+"""Check that tool calls issued in the same agent step run concurrently.
+
+Stub tools sleep for a fixed time; a step that calls all of them should take
+about as long as the slowest tool, not the sum. A tool that exceeds its
+timeout answers with its fallback message.
+
+Usage:
+    python benchmarks/bench_parallel_tools.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.tools import tool  # noqa: E402
+from langgraph.graph import END, START, MessagesState, StateGraph  # noqa: E402
+from langgraph.prebuilt import ToolNode  # noqa: E402
+
+from ai_agent import with_timeout  # noqa: E402
+
+SPECIALIST_DELAY = 0.8
+EMERGENCY_DELAY = 0.5
+SLOW_DELAY = 5.0
+SLOW_TIMEOUT = 0.3
+
+
+@tool
+@with_timeout(5, "specialist fallback")
+async def ask_mental_health_specialist(query: str) -> str:
+    """Stub specialist."""
+    await asyncio.sleep(SPECIALIST_DELAY)
+    return f"specialist answer to {query}"
+
+
+@tool
+@with_timeout(5, "emergency fallback")
+async def emergency_call_tool() -> str:
+    """Stub emergency call."""
+    await asyncio.sleep(EMERGENCY_DELAY)
+    return "call placed"
+
+
+@tool
+@with_timeout(SLOW_TIMEOUT, "slow tool timed out")
+async def slow_tool() -> str:
+    """Stub tool that never finishes in time."""
+    await asyncio.sleep(SLOW_DELAY)
+    return "too late"
+
+
+def tool_call(name: str, args: dict, call_id: str) -> dict:
+    return {"name": name, "args": args, "id": call_id, "type": "tool_call"}
+
+
+async def main():
+    # A one-step graph around the same ToolNode the agent uses
+    builder = StateGraph(MessagesState)
+    builder.add_node("tools", ToolNode([ask_mental_health_specialist, emergency_call_tool, slow_tool]))
+    builder.add_edge(START, "tools")
+    builder.add_edge("tools", END)
+    graph = builder.compile()
+
+    message = AIMessage(content="", tool_calls=[
+        tool_call("ask_mental_health_specialist", {"query": "I can't go on"}, "1"),
+        tool_call("emergency_call_tool", {}, "2"),
+        tool_call("slow_tool", {}, "3"),
+    ])
+
+    start = time.perf_counter()
+    result = await graph.ainvoke({"messages": [message]})
+    elapsed = time.perf_counter() - start
+
+    for msg in result["messages"][1:]:
+        print(f"{msg.name:<30} {msg.content}")
+
+    slowest = max(SPECIALIST_DELAY, EMERGENCY_DELAY, SLOW_TIMEOUT)
+    total = SPECIALIST_DELAY + EMERGENCY_DELAY + SLOW_TIMEOUT
+    print(f"\nwall clock {elapsed:.2f}s  (slowest tool {slowest:.2f}s, sequential sum {total:.2f}s)")
+    assert elapsed < slowest + 0.25, "tool calls did not run concurrently"
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
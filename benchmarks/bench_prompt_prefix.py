@@ -0,0 +1,73 @@
+"""Compare Ollama prompt evaluation with the therapist prompt baked in vs sent inline.
+
+Requires a running Ollama with the MedGemma model pulled. Each mode runs in a
+fresh process with MEDGEMMA_PREFIX_MODE set, and reports Ollama's own
+prompt_eval_count / prompt_eval_duration for each request (the first request of
+a mode includes loading the model and evaluating the prefix).
+
+Usage:
+    python benchmarks/bench_prompt_prefix.py [--requests 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PROMPTS = [
+    "I've been feeling really anxious before work every morning.",
+    "My sister and I keep fighting and I don't know how to fix it.",
+    "I can't sleep since my breakup.",
+    "Thanks, that actually helped.",
+]
+
+
+async def run_requests(count: int) -> list:
+    from tools import achat_medgemma
+
+    results = []
+    for i in range(count):
+        response = await achat_medgemma(PROMPTS[i % len(PROMPTS)])
+        results.append({
+            "prompt_eval_count": response.get("prompt_eval_count") or 0,
+            "prompt_eval_ms": (response.get("prompt_eval_duration") or 0) / 1e6,
+        })
+    return results
+
+
+def run_mode(mode: str, count: int) -> list:
+    env = dict(os.environ, MEDGEMMA_PREFIX_MODE=mode)
+    output = subprocess.check_output(
+        [sys.executable, __file__, "--child", "--requests", str(count)], cwd=ROOT, env=env
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare MedGemma prompt prefix modes")
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_requests(args.requests))))
+        return
+
+    print(f"{'mode':<8} {'first eval ms':>14} {'median eval ms':>15} {'median tokens':>14}")
+    for mode in ("inline", "baked"):
+        results = run_mode(mode, args.requests)
+        warm = results[1:] or results
+        print(
+            f"{mode:<8} {results[0]['prompt_eval_ms']:>14.1f} "
+            f"{statistics.median(r['prompt_eval_ms'] for r in warm):>15.1f} "
+            f"{statistics.median(r['prompt_eval_count'] for r in warm):>14.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
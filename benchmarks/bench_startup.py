@@ -0,0 +1,74 @@
+"""Cold start benchmark: import time of `main` and time until the first /health response.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--port 8765] [--json]
+
+Each run uses a fresh interpreter so module caches don't hide import costs.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def measure_import() -> float:
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def measure_first_health(port: int, timeout: float = 60.0) -> float:
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError("Server did not answer /health in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON for tracking")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    health = [measure_first_health(args.port) for _ in range(args.runs)]
+
+    results = {
+        "runs": args.runs,
+        "import_main_s": {"median": statistics.median(imports), "min": min(imports)},
+        "first_health_s": {"median": statistics.median(health), "min": min(health)},
+    }
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"import main      median {results['import_main_s']['median']:.3f}s  min {results['import_main_s']['min']:.3f}s")
+        print(f"first /health    median {results['first_health_s']['median']:.3f}s  min {results['first_health_s']['min']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""In-process read-through caches for read-mostly lookups.
+
+Each worker keeps its own caches, so a write made by another worker is
+only seen here once the entry expires; TTLs bound that staleness. Writes
+made through this worker invalidate (or refresh) the entry immediately.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+from config import USAGE_CACHE_TTL_SECONDS, USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, name: str, max_entries: int, ttl: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, expires_at, generation written)
+        self._lock = threading.Lock()
+        # Bumped by every write; lets a slow load tell that newer data arrived meanwhile
+        self._generation = 0
+        self._last_invalidation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any],
+                    is_fresh: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Cached value for key, calling loader on a miss; None results are not cached.
+
+        is_fresh can reject values that went stale before their TTL (cached
+        ones are reloaded, loaded ones are returned but not cached).
+        """
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now and (is_fresh is None or is_fresh(entry[0])):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            started = self._generation
+
+        value = loader()
+        if value is None or (is_fresh is not None and not is_fresh(value)):
+            return value
+        with self._lock:
+            # A put, invalidate or clear during the load may carry newer data than we read
+            entry = self._entries.get(key)
+            if self._last_invalidation > started or (entry is not None and entry[2] > started):
+                return value
+            self._store(key, value)
+        return value
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._generation += 1
+        self._entries[key] = (value, time.monotonic() + self.ttl, self._generation)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a freshly written value"""
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._generation += 1
+            self._last_invalidation = self._generation
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._last_invalidation = self._generation
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                # Every hit is a lookup that would otherwise have queried the database
+                "db_queries_saved": self.hits,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+user_cache = TTLCache("users", USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL_SECONDS)
+usage_cache = TTLCache("usage", USER_CACHE_MAX_ENTRIES, USAGE_CACHE_TTL_SECONDS)
+
+
+def cache_stats() -> List[dict]:
+    """Statistics for every cache in this worker"""
+    return [user_cache.stats(), usage_cache.stats()]
@@ -0,0 +1,212 @@
+"""Versioned, optionally zstd-compressed storage format for chat transcripts.
+
+Trained dictionaries are stored in the zstd_dictionaries table (see
+database.py) so that every host can read every row. Dictionaries from the
+older CHAT_ZSTD_DICT_DIR directory are imported into the table the first
+time they are needed. Each worker re-reads the active dictionary id every
+CHAT_DICT_REFRESH_SECONDS, so a newly trained one is picked up without a restart.
+"""
+import logging
+import os
+import time
+from typing import Optional, Union
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+from config import (
+    CHAT_COMPRESSION_LEVEL, CHAT_COMPRESSION_MIN_BYTES, CHAT_DICT_REFRESH_SECONDS, CHAT_ZSTD_DICT_DIR,
+)
+
+try:
+    import zstandard as zstd
+except ImportError:  # Compression is optional, rows are stored uncompressed without it
+    zstd = None
+
+logger = logging.getLogger(__name__)
+
+# Format version byte written in front of every stored transcript
+FORMAT_PLAIN = 0x00  # UTF-8 text, stored as-is
+FORMAT_ZSTD = 0x01   # zstd frame, dictionary id (if any) is recorded in the frame header
+
+ACTIVE_DICT_FILE = "ACTIVE"
+
+_dictionaries = {}
+_decompressors = {}
+_compressor = None
+_compressor_dict_id = None
+_active_dict_id = None
+_active_dict_expires_at = None  # monotonic time the cached id must be re-read at; None = not loaded
+
+
+def _dict_path(dict_id: int) -> str:
+    return os.path.join(CHAT_ZSTD_DICT_DIR, f"{dict_id}.dict")
+
+
+def _import_legacy_dictionary(dict_id: int, activate: bool = False) -> Optional[bytes]:
+    """Copy a dictionary file from CHAT_ZSTD_DICT_DIR into the database, if there is one"""
+    from database import save_zstd_dictionary
+
+    try:
+        with open(_dict_path(dict_id), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    save_zstd_dictionary(dict_id, data, activate=activate)
+    logger.info("Imported zstd dictionary %d from %s into the database", dict_id, CHAT_ZSTD_DICT_DIR)
+    return data
+
+
+def _load_dictionary(dict_id: int):
+    """Load (and cache) a trained dictionary by its zstd dictionary id"""
+    if dict_id not in _dictionaries:
+        from database import load_zstd_dictionary
+
+        data = load_zstd_dictionary(dict_id) or _import_legacy_dictionary(dict_id)
+        if data is None:
+            raise LookupError(f"zstd dictionary {dict_id} is not stored in the database")
+        _dictionaries[dict_id] = zstd.ZstdCompressionDict(data)
+    return _dictionaries[dict_id]
+
+
+def active_dictionary_id() -> Optional[int]:
+    """Id of the dictionary used for new writes, or None to compress without one"""
+    global _active_dict_id, _active_dict_expires_at
+    now = time.monotonic()
+    if _active_dict_expires_at is None or now >= _active_dict_expires_at:
+        from database import get_active_zstd_dictionary_id
+
+        _active_dict_id = get_active_zstd_dictionary_id()
+        if _active_dict_id is None:
+            try:
+                with open(os.path.join(CHAT_ZSTD_DICT_DIR, ACTIVE_DICT_FILE)) as f:
+                    legacy_id = int(f.read().strip())
+            except (OSError, ValueError):
+                legacy_id = None
+            if legacy_id and _import_legacy_dictionary(legacy_id, activate=True) is not None:
+                _active_dict_id = legacy_id
+        _active_dict_expires_at = now + CHAT_DICT_REFRESH_SECONDS
+    return _active_dict_id
+
+
+def require_durable_dictionary() -> Optional[int]:
+    """Active dictionary id, after checking it is stored in the database.
+
+    Rows written with a dictionary that only exists on local disk would be
+    unreadable everywhere else, so bulk rewrites refuse to run in that case.
+    """
+    from database import load_zstd_dictionary
+
+    dict_id = active_dictionary_id()
+    if dict_id and load_zstd_dictionary(dict_id) is None:
+        raise RuntimeError(
+            f"Active zstd dictionary {dict_id} is not stored in the database; "
+            "run `python manage.py train-dictionary` again before compressing history"
+        )
+    return dict_id
+
+
+def _get_compressor():
+    global _compressor, _compressor_dict_id
+    dict_id = active_dictionary_id()
+    if _compressor is None or _compressor_dict_id != dict_id:
+        dict_data = _load_dictionary(dict_id) if dict_id else None
+        _compressor = zstd.ZstdCompressor(level=CHAT_COMPRESSION_LEVEL, dict_data=dict_data)
+        _compressor_dict_id = dict_id
+    return _compressor
+
+
+def reset_codec_cache() -> None:
+    """Forget cached compressors/dictionaries (after training a new dictionary)"""
+    global _compressor, _active_dict_expires_at
+    _compressor = None
+    _active_dict_expires_at = None
+    _dictionaries.clear()
+    _decompressors.clear()
+
+
+def encode_text(text: str) -> bytes:
+    """Encode transcript text into the versioned storage format"""
+    raw = text.encode("utf-8")
+    if zstd is not None and len(raw) >= CHAT_COMPRESSION_MIN_BYTES:
+        compressed = _get_compressor().compress(raw)
+        if len(compressed) < len(raw):
+            return bytes([FORMAT_ZSTD]) + compressed
+    return bytes([FORMAT_PLAIN]) + raw
+
+
+def decode_text(value: Union[str, bytes, memoryview, None]) -> Optional[str]:
+    """Decode a stored transcript; plain strings are legacy uncompressed rows"""
+    if value is None or isinstance(value, str):
+        return value
+
+    data = bytes(value)
+    if not data:
+        return ""
+
+    version, payload = data[0], data[1:]
+    if version == FORMAT_PLAIN:
+        return payload.decode("utf-8")
+    if version == FORMAT_ZSTD:
+        if zstd is None:
+            raise RuntimeError("zstandard is required to read compressed chat history")
+        dict_id = zstd.get_frame_parameters(payload).dict_id
+        if dict_id not in _decompressors:
+            dict_data = _load_dictionary(dict_id) if dict_id else None
+            _decompressors[dict_id] = zstd.ZstdDecompressor(dict_data=dict_data)
+        return _decompressors[dict_id].decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown chat transcript format version: {version}")
+
+
+def needs_reencoding(value: Union[str, bytes, memoryview, None]) -> bool:
+    """Whether a stored value is legacy text or was compressed without the active dictionary"""
+    if value is None:
+        return False
+    if isinstance(value, str):
+        return True
+
+    data = bytes(value)
+    if not data or zstd is None:
+        return False
+    if data[0] == FORMAT_PLAIN:
+        return len(data) - 1 >= CHAT_COMPRESSION_MIN_BYTES
+    if data[0] == FORMAT_ZSTD:
+        return (zstd.get_frame_parameters(data[1:]).dict_id or None) != active_dictionary_id()
+    return False
+
+
+def train_dictionary(samples: list, dict_size: int = 16 * 1024) -> int:
+    """Train a zstd dictionary from sample transcripts, store it and make it active"""
+    if zstd is None:
+        raise RuntimeError("zstandard is required to train a dictionary")
+
+    try:
+        dictionary = zstd.train_dictionary(dict_size, [s.encode("utf-8") for s in samples])
+    except zstd.ZstdError as e:
+        raise ValueError(f"Not enough chat history to train a dictionary: {e}")
+    dict_id = dictionary.dict_id()
+
+    from database import save_zstd_dictionary
+
+    save_zstd_dictionary(dict_id, dictionary.as_bytes(), activate=True)
+    reset_codec_cache()
+    return dict_id
+
+
+class CompressedText(TypeDecorator):
+    """Binary column holding versioned (optionally zstd-compressed) text.
+
+    Values are compressed on write but returned raw on read, so the cost of
+    decompression is only paid when a row is actually serialized.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if isinstance(value, str):
+            return encode_text(value)
+        return value
+
+    def process_result_value(self, value, dialect):
+        return value
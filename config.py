@@ -16,3 +16,85 @@ EMERGENCY_CONTACT = os.getenv("EMERGENCY_CONTACT")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
+
+# Chat transcript compression
+CHAT_COMPRESSION_LEVEL = int(os.getenv("CHAT_COMPRESSION_LEVEL", 3))
+CHAT_COMPRESSION_MIN_BYTES = int(os.getenv("CHAT_COMPRESSION_MIN_BYTES", 32))
+# Dictionaries live in the database; this older directory is only read to import them
+CHAT_ZSTD_DICT_DIR = os.getenv("CHAT_ZSTD_DICT_DIR", "./zstd_dicts")
+# How long a worker uses its cached active dictionary id before re-reading it
+CHAT_DICT_REFRESH_SECONDS = float(os.getenv("CHAT_DICT_REFRESH_SECONDS", 60))
+
+# Chat history retention
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", 90))
+CHAT_ARCHIVE_INTERVAL_SECONDS = int(os.getenv("CHAT_ARCHIVE_INTERVAL_SECONDS", 3600))
+CHAT_ARCHIVE_BATCH_SIZE = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", 500))
+CHAT_DELETE_BATCH_SIZE = int(os.getenv("CHAT_DELETE_BATCH_SIZE", 500))
+
+# Bulk provisioning: password hashing processes per API worker, and the
+# smallest batch worth sending to them (smaller ones hash in-thread)
+PROVISION_HASH_WORKERS = int(os.getenv("PROVISION_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PROVISION_PARALLEL_MIN_ROWS = int(os.getenv("PROVISION_PARALLEL_MIN_ROWS", 64))
+
+# Startup
+# Run schema migrations when the API starts (convenient for local development)
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() in ("1", "true", "yes")
+
+# Serving (see serve.py)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", 30))
+# Build the agent graph and clients in each worker before it accepts requests
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+# Where cross-worker state lives: "database" (default) or "local" (single process only)
+SHARED_STATE_BACKEND = os.getenv("SHARED_STATE_BACKEND", "database")
+
+# Agent tool timeouts (seconds)
+SPECIALIST_TOOL_TIMEOUT_SECONDS = float(os.getenv("SPECIALIST_TOOL_TIMEOUT_SECONDS", 60))
+EMERGENCY_TOOL_TIMEOUT_SECONDS = float(os.getenv("EMERGENCY_TOOL_TIMEOUT_SECONDS", 20))
+THERAPIST_TOOL_TIMEOUT_SECONDS = float(os.getenv("THERAPIST_TOOL_TIMEOUT_SECONDS", 10))
+
+# MedGemma prompt prefix reuse: "baked" (therapist prompt built into a derived model) or "inline"
+MEDGEMMA_PREFIX_MODE = os.getenv("MEDGEMMA_PREFIX_MODE", "baked")
+MEDGEMMA_BAKED_MODEL = os.getenv("MEDGEMMA_BAKED_MODEL", "safespace-medgemma")
+# After the derived model could not be created, send the prompt inline this long before retrying
+MEDGEMMA_BAKED_RETRY_SECONDS = float(os.getenv("MEDGEMMA_BAKED_RETRY_SECONDS", 60))
+# How long Ollama keeps the model (and its cached prompt prefix) loaded between requests
+MEDGEMMA_KEEP_ALIVE = os.getenv("MEDGEMMA_KEEP_ALIVE", "30m")
+
+# Directory to record /ask agent event streams into for offline replay (unset = off)
+AGENT_RECORD_DIR = os.getenv("AGENT_RECORD_DIR")
+
+# Per-worker caches for user profiles and usage snapshots (TTL 0 disables)
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", 10000))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 300))
+# Other workers' /ask increments show up in /usage after at most this long
+USAGE_CACHE_TTL_SECONDS = float(os.getenv("USAGE_CACHE_TTL_SECONDS", 10))
+
+# Ollama hosts the specialist tool is balanced across, comma-separated
+# (e.g. "http://gpu1:11434,http://gpu2:11434"); empty uses the default host
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("OLLAMA_HOSTS", "").split(",") if h.strip()]
+OLLAMA_HEALTH_INTERVAL_SECONDS = float(os.getenv("OLLAMA_HEALTH_INTERVAL_SECONDS", 10))
+OLLAMA_HEALTH_TIMEOUT_SECONDS = float(os.getenv("OLLAMA_HEALTH_TIMEOUT_SECONDS", 2))
+# Consecutive failures before a host stops getting traffic, and for how long
+OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", 3))
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", 30))
+
+# Monthly usage rollover: longest the scheduler sleeps between checks (0 disables it)
+USAGE_ROLLOVER_CHECK_SECONDS = int(os.getenv("USAGE_ROLLOVER_CHECK_SECONDS", 3600))
+
+# MedGemma generation budgets (see generation_policy.py)
+MEDGEMMA_ADAPTIVE_GENERATION = os.getenv("MEDGEMMA_ADAPTIVE_GENERATION", "true").lower() in ("1", "true", "yes")
+MEDGEMMA_MAX_TOKENS = int(os.getenv("MEDGEMMA_MAX_TOKENS", 350))
+# Target time for one specialist generation; budgets shrink when decoding is slow
+MEDGEMMA_LATENCY_SLO_MS = float(os.getenv("MEDGEMMA_LATENCY_SLO_MS", 20000))
+# Share of the budget after which generation stops at the next sentence boundary
+MEDGEMMA_EARLY_STOP_FRACTION = float(os.getenv("MEDGEMMA_EARLY_STOP_FRACTION", 0.7))
+
+# Logging (see logging_setup.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Per-module levels and DEBUG/INFO sampling rates, e.g. "ai_agent=DEBUG,llm_pool=WARNING" / "ai_agent=0.1"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Records waiting for the background writer; more than this are dropped, not waited for
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
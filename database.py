@@ -1,13 +1,21 @@
 import uuid
 import os
-from datetime import datetime, timezone
-from typing import Dict, List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
 import calendar
-from sqlalchemy import create_engine, Column, String, Integer, Boolean, Text, DateTime
+import time
+from datetime import timedelta
+from sqlalchemy import create_engine, BigInteger, Column, String, Integer, Boolean, LargeBinary, Text, Date, DateTime, Float, Index, and_, func, insert, inspect, or_, text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from models import User, UserCreate
 from auth import hash_password, verify_password
+from cache import usage_cache, user_cache
+from chat_codec import CompressedText, decode_text, encode_text, needs_reencoding, require_durable_dictionary
+from config import CHAT_ARCHIVE_BATCH_SIZE, CHAT_DELETE_BATCH_SIZE, CHAT_RETENTION_DAYS
+from insights import SENTIMENT_LABELS, analyze_message
+from message_metrics import MessageMetrics, latency_bucket, percentile_from_buckets
 
 
 # Get database URL from environment variable (PostgreSQL on Render, SQLite locally)
@@ -48,11 +56,56 @@ class ChatHistoryDB(Base):
     
     id = Column(String, primary_key=True, index=True)
     user_id = Column(String, index=True, nullable=False)
-    message = Column(Text, nullable=False)
-    response = Column(Text, nullable=False)
+    message_data = Column("message", CompressedText, nullable=False)
+    response_data = Column("response", CompressedText, nullable=False)
     tool_used = Column(String, nullable=True)
     created_at = Column(DateTime, nullable=False)
 
+    # Transcripts are stored compressed and only decoded when accessed
+    @property
+    def message(self) -> str:
+        return decode_text(self.message_data)
+
+    @message.setter
+    def message(self, value: str):
+        self.message_data = value
+
+    @property
+    def response(self) -> str:
+        return decode_text(self.response_data)
+
+    @response.setter
+    def response(self, value: str):
+        self.response_data = value
+
+
+class ChatHistoryArchiveDB(Base):
+    """Chat history older than the retention window.
+
+    Partitioned by month on PostgreSQL; partitions are created by the archiver.
+    Transcripts are copied in their stored (compressed) form.
+    """
+    __tablename__ = "chat_history_archive"
+    __table_args__ = (
+        Index("ix_chat_history_archive_user_created", "user_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id = Column(String, primary_key=True)
+    created_at = Column(DateTime, primary_key=True)
+    user_id = Column(String, nullable=False)
+    message_data = Column("message", CompressedText, nullable=False)
+    response_data = Column("response", CompressedText, nullable=False)
+    tool_used = Column(String, nullable=True)
+
+    @property
+    def message(self) -> str:
+        return decode_text(self.message_data)
+
+    @property
+    def response(self) -> str:
+        return decode_text(self.response_data)
+
 
 class UserUsageDB(Base):
     __tablename__ = "user_usage"
@@ -64,8 +117,113 @@ class UserUsageDB(Base):
     last_reset_date = Column(DateTime, nullable=False)
 
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
+class SharedStateDB(Base):
+    """Key/value state shared by API workers (see shared_state.DatabaseStore)"""
+    __tablename__ = "shared_state"
+
+    key = Column(String, primary_key=True)
+    value = Column(String, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+
+
+class ZstdDictionaryDB(Base):
+    """Trained zstd dictionaries for chat transcripts (see chat_codec)"""
+    __tablename__ = "zstd_dictionaries"
+
+    # zstd's own dictionary id, recorded in the header of every frame compressed with it
+    dict_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    data = Column(LargeBinary, nullable=False)
+    # The dictionary new transcripts are compressed with
+    is_active = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+class MessageMetricsDB(Base):
+    """Token and latency accounting for one /ask request"""
+    __tablename__ = "message_metrics"
+
+    chat_id = Column(String, primary_key=True)
+    user_id = Column(String, index=True, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    path = Column(String, nullable=True)
+    groq_calls = Column(Integer, default=0)
+    groq_prompt_tokens = Column(Integer, default=0)
+    groq_completion_tokens = Column(Integer, default=0)
+    ollama_calls = Column(Integer, default=0)
+    ollama_prompt_eval_count = Column(Integer, default=0)
+    ollama_eval_count = Column(Integer, default=0)
+    ollama_prompt_eval_ms = Column(Integer, default=0)
+    ollama_eval_ms = Column(Integer, default=0)
+    ollama_total_ms = Column(Integer, default=0)
+    usage_ms = Column(Integer, default=0)
+    agent_ms = Column(Integer, default=0)
+    save_ms = Column(Integer, default=0)
+    total_ms = Column(Integer, default=0)
+
+
+class MetricsDailyRollupDB(Base):
+    """Per-day totals, per user and globally (scope "*"), updated on every /ask"""
+    __tablename__ = "metrics_daily_rollup"
+
+    scope = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    messages = Column(Integer, nullable=False, default=0)
+    groq_prompt_tokens = Column(Integer, nullable=False, default=0)
+    groq_completion_tokens = Column(Integer, nullable=False, default=0)
+    ollama_eval_count = Column(Integer, nullable=False, default=0)
+    total_ms = Column(Integer, nullable=False, default=0)
+
+
+class LatencyHistogramDB(Base):
+    """Per-day latency histogram (see message_metrics.LATENCY_BUCKETS_MS)"""
+    __tablename__ = "latency_histogram"
+
+    scope = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class MessageInsightDB(Base):
+    """Sentiment and topic labels of one chat message (see insights.py)"""
+    __tablename__ = "message_insights"
+
+    id = Column(String, primary_key=True)  # chat_history id
+    user_id = Column(String, index=True, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    sentiment = Column(Float, nullable=False)
+    label = Column(String, nullable=False)
+    topics = Column(String, nullable=False)  # comma-separated
+
+
+class InsightDailyDB(Base):
+    """Per-user, per-day mood totals, updated as messages are labelled"""
+    __tablename__ = "insight_daily"
+
+    user_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    messages = Column(Integer, nullable=False, default=0)
+    sentiment_sum = Column(Float, nullable=False, default=0)
+    negative = Column(Integer, nullable=False, default=0)
+    neutral = Column(Integer, nullable=False, default=0)
+    positive = Column(Integer, nullable=False, default=0)
+
+
+class TopicDailyDB(Base):
+    """Per-user, per-day message counts by topic"""
+    __tablename__ = "topic_daily"
+
+    user_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    topic = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+def init_db() -> None:
+    """Create missing tables and upgrade columns (run via `python manage.py migrate`)"""
+    Base.metadata.create_all(bind=engine)
+    prepare_compressed_history_columns()
+    drop_shared_state_counter()
 
 
 def get_db():
@@ -107,6 +265,8 @@ def create_user(user_data: UserCreate) -> User:
         
         # Initialize usage tracking
         initialize_user_usage(user_id)
+        user_cache.invalidate(user_id)
+        usage_cache.invalidate(user_id)
         
         return User(
             id=user_id,
@@ -119,6 +279,54 @@ def create_user(user_data: UserCreate) -> User:
         db.close()
 
 
+def find_existing_emails(emails: List[str], chunk_size: int = 500) -> set:
+    """Which of the given emails already have accounts (one IN query per chunk)"""
+    db = SessionLocal()
+
+    try:
+        existing = set()
+        for i in range(0, len(emails), chunk_size):
+            chunk = emails[i:i + chunk_size]
+            existing.update(row.email for row in db.query(UserDB.email).filter(UserDB.email.in_(chunk)))
+        return existing
+    finally:
+        db.close()
+
+
+def bulk_create_users(users: List[dict]) -> None:
+    """Insert users (id, email, full_name, password_hash) and their usage rows in one transaction.
+
+    Raises IntegrityError if any email is taken; nothing is inserted in that case.
+    """
+    now = datetime.utcnow()
+    period_start, period_end = _current_usage_period(now)
+    db = SessionLocal()
+
+    try:
+        db.execute(insert(UserDB), [
+            {**user, "created_at": now, "is_active": True} for user in users
+        ])
+        db.execute(insert(UserUsageDB), [
+            {
+                "user_id": user["id"],
+                "messages_used_this_month": 0,
+                "current_period_start": period_start,
+                "current_period_end": period_end,
+                "last_reset_date": now
+            }
+            for user in users
+        ])
+        db.commit()
+        for user in users:
+            user_cache.invalidate(user["id"])
+            usage_cache.invalidate(user["id"])
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
 def authenticate_user(email: str, password: str) -> Optional[User]:
     """Authenticate user login"""
     db = SessionLocal()
@@ -140,7 +348,11 @@ def authenticate_user(email: str, password: str) -> Optional[User]:
 
 
 def get_user_by_id(user_id: str) -> Optional[User]:
-    """Get user by ID"""
+    """Get user by ID (cached per worker for USER_CACHE_TTL_SECONDS)"""
+    return user_cache.get_or_load(user_id, lambda: _load_user(user_id))
+
+
+def _load_user(user_id: str) -> Optional[User]:
     db = SessionLocal()
     
     try:
@@ -159,48 +371,52 @@ def get_user_by_id(user_id: str) -> Optional[User]:
         db.close()
 
 
-def save_chat_message(user_id: str, message: str, response: str, tool_used: str):
-    """Save chat message to user's history"""
+def save_chat_message(user_id: str, message: str, response: str, tool_used: str) -> Tuple[str, datetime]:
+    """Save chat message to user's history, returning its id and stored timestamp"""
     db = SessionLocal()
     
     try:
+        chat_id = str(uuid.uuid4())
+        created_at = datetime.utcnow()
         chat_entry = ChatHistoryDB(
-            id=str(uuid.uuid4()),
+            id=chat_id,
             user_id=user_id,
             message=message,
             response=response,
             tool_used=tool_used,
-            created_at=datetime.utcnow()
+            created_at=created_at
         )
         
         db.add(chat_entry)
         db.commit()
+        return chat_id, created_at
     finally:
         db.close()
 
 
-def get_user_chat_history(user_id: str) -> List[dict]:
-    """Get user's chat history"""
-    db = SessionLocal()
+def _current_usage_period(now: datetime):
+    """(period_start, period_end) of the month containing now.
+
+    Usage timestamps are stored as naive UTC, like every other timestamp in the database.
+    """
+    last_day = calendar.monthrange(now.year, now.month)[1]
     
-    try:
-        chat_entries = db.query(ChatHistoryDB).filter(
-            ChatHistoryDB.user_id == user_id
-        ).order_by(ChatHistoryDB.created_at.desc()).all()
-        
-        history = []
-        for entry in chat_entries:
-            history.append({
-                "id": entry.id,
-                "message": entry.message,
-                "response": entry.response,
-                "tool_used": entry.tool_used,
-                "created_at": entry.created_at.isoformat()
-            })
-        
-        return history
-    finally:
-        db.close()
+    period_end = now.replace(day=last_day, hour=23, minute=59, second=59, microsecond=0)
+    period_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return period_start, period_end
+
+
+def _new_usage(user_id: str) -> UserUsageDB:
+    now = datetime.utcnow()
+    period_start, period_end = _current_usage_period(now)
+    
+    return UserUsageDB(
+        user_id=user_id,
+        messages_used_this_month=0,
+        current_period_start=period_start,
+        current_period_end=period_end,
+        last_reset_date=now
+    )
 
 
 def initialize_user_usage(user_id: str) -> None:
@@ -208,22 +424,7 @@ def initialize_user_usage(user_id: str) -> None:
     db = SessionLocal()
     
     try:
-        now = datetime.now(timezone.utc)
-        last_day = calendar.monthrange(now.year, now.month)[1]
-        
-        # Create timezone-aware datetimes
-        period_end = now.replace(day=last_day, hour=23, minute=59, second=59, microsecond=0)
-        period_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        usage = UserUsageDB(
-            user_id=user_id,
-            messages_used_this_month=0,
-            current_period_start=period_start,
-            current_period_end=period_end,
-            last_reset_date=now
-        )
-        
-        db.add(usage)
+        db.add(_new_usage(user_id))
         db.commit()
     finally:
         db.close()
@@ -231,137 +432,722 @@ def initialize_user_usage(user_id: str) -> None:
 
 
 def get_user_usage(user_id: str) -> dict:
-    """Get current usage for a user"""
+    """Get current usage for a user (cached per worker for USAGE_CACHE_TTL_SECONDS)"""
+    return usage_cache.get_or_load(user_id, lambda: _load_user_usage(user_id), is_fresh=_usage_period_current)
+
+
+def _usage_period_current(snapshot: dict) -> bool:
+    """Whether a usage snapshot is for the period in progress.
+
+    Snapshots from an ended period are never served from cache, so no worker
+    keeps showing last month's count once any worker has run the rollover.
+    """
+    return datetime.fromisoformat(snapshot["current_period_end"]) > datetime.utcnow()
+
+
+def _load_user_usage(user_id: str) -> dict:
     db = SessionLocal()
     
     try:
         usage = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).first()
         
         if not usage:
-            initialize_user_usage(user_id)
-            usage = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).first()
+            usage = _new_usage(user_id)
+            db.add(usage)
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent first request created the row; use theirs
+                db.rollback()
+                usage = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).one()
         
-        return {
-            "user_id": usage.user_id,
-            "messages_used_this_month": usage.messages_used_this_month,
-            "current_period_start": usage.current_period_start.isoformat(),
-            "current_period_end": usage.current_period_end.isoformat(),
-            "last_reset_date": usage.last_reset_date.isoformat()
-        }
+        return _usage_snapshot(usage)
     finally:
         db.close()
 
 
+def _usage_snapshot(usage: UserUsageDB) -> dict:
+    return {
+        "user_id": usage.user_id,
+        "messages_used_this_month": usage.messages_used_this_month,
+        "current_period_start": usage.current_period_start.isoformat(),
+        "current_period_end": usage.current_period_end.isoformat(),
+        "last_reset_date": usage.last_reset_date.isoformat()
+    }
+
+
 def increment_user_usage(user_id: str) -> dict:
-    """Increment user's message count"""
+    """Increment user's message count.
+
+    Monthly resets are done for all users at once by rollover_usage_periods,
+    so this is a single atomic UPDATE on the request path.
+    """
     db = SessionLocal()
     
     try:
-        usage = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).first()
-        
-        if not usage:
-            db.close()
-            initialize_user_usage(user_id)
-            db = SessionLocal()
-            usage = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).first()
-        
-        # Check if we need to reset monthly counter
-        now = datetime.now(timezone.utc)
-        
-        # Make sure both datetimes are timezone-aware for comparison
-        period_end = usage.current_period_end
-        if period_end.tzinfo is None:
-            # If stored datetime is naive, make it UTC-aware
-            period_end = period_end.replace(tzinfo=timezone.utc)
-        
-        if now > period_end:
-            reset_monthly_usage(user_id)
-            db.close()
-            db = SessionLocal()
-            usage = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).first()
-        
-        # Increment message count
-        usage.messages_used_this_month += 1
-        db.commit()
-        db.refresh(usage)
+        increment = {UserUsageDB.messages_used_this_month: UserUsageDB.messages_used_this_month + 1}
+        updated = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).update(
+            increment, synchronize_session=False
+        )
+        if not updated:
+            usage = _new_usage(user_id)
+            usage.messages_used_this_month = 1
+            db.add(usage)
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent first request inserted the row first; count this message on it
+            db.rollback()
+            db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).update(
+                increment, synchronize_session=False
+            )
+            db.commit()
         
-        return {
-            "user_id": usage.user_id,
-            "messages_used_this_month": usage.messages_used_this_month,
-            "current_period_start": usage.current_period_start.isoformat(),
-            "current_period_end": usage.current_period_end.isoformat(),
-            "last_reset_date": usage.last_reset_date.isoformat()
-        }
+        usage = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).first()
+        snapshot = _usage_snapshot(usage)
+        usage_cache.put(user_id, snapshot)
+        return snapshot
     finally:
         db.close()
 
 
+def next_usage_rollover(now: datetime) -> datetime:
+    """When the usage period containing now ends (start of the next UTC month)"""
+    return _next_month_start(now)
+
 
-def reset_monthly_usage(user_id: str) -> None:
-    """Reset user's monthly message count"""
+def rollover_usage_periods(now: Optional[datetime] = None) -> int:
+    """Start the current period for every usage row whose period has ended.
+
+    One set-based UPDATE; running it again in the same period changes
+    nothing, and after downtime rows that missed several boundaries all
+    move straight to the period containing now. Returns the rows reset.
+    """
+    now = now or datetime.utcnow()
+    period_start, period_end = _current_usage_period(now)
     db = SessionLocal()
     
     try:
-        now = datetime.now(timezone.utc)
-        last_day = calendar.monthrange(now.year, now.month)[1]
-        
-        # Create timezone-aware datetimes
-        period_end = now.replace(day=last_day, hour=23, minute=59, second=59, microsecond=0)
-        period_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        usage = db.query(UserUsageDB).filter(UserUsageDB.user_id == user_id).first()
-        
-        if usage:
-            usage.messages_used_this_month = 0
-            usage.current_period_start = period_start
-            usage.current_period_end = period_end
-            usage.last_reset_date = now
-            db.commit()
+        reset = db.query(UserUsageDB).filter(UserUsageDB.current_period_end < now).update({
+            UserUsageDB.messages_used_this_month: 0,
+            UserUsageDB.current_period_start: period_start,
+            UserUsageDB.current_period_end: period_end,
+            UserUsageDB.last_reset_date: now
+        }, synchronize_session=False)
+        db.commit()
     finally:
         db.close()
+    
+    # Other workers drop their own snapshots of ended periods (see _usage_period_current)
+    if reset:
+        usage_cache.clear()
+    return reset
 
 
 
-def get_user_chat_history(user_id: str, limit: int = None) -> List[dict]:
-    """Get user's chat history with optional limit"""
+def _history_columns(model):
+    return (model.id, model.message_data, model.response_data, model.tool_used, model.created_at)
+
+
+def _serialize_history(rows) -> List[dict]:
+    """Build response entries straight from (id, message, response, tool_used, created_at) rows"""
+    return [
+        {
+            "id": row[0],
+            "message": decode_text(row[1]),
+            "response": decode_text(row[2]),
+            "tool_used": row[3],
+            "created_at": row[4]
+        }
+        for row in rows
+    ]
+
+
+def _older_than(model, before: datetime, before_id: Optional[str]):
+    """Rows after the (created_at, id) cursor in newest-first order"""
+    if before_id is None:
+        return model.created_at < before
+    return or_(model.created_at < before, and_(model.created_at == before, model.id < before_id))
+
+
+def get_user_chat_history(
+    user_id: str,
+    limit: int = None,
+    include_archived: bool = False,
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None
+) -> List[dict]:
+    """Get user's chat history with optional limit, newest first.
+
+    Only the hot table is read unless include_archived is set, in which case
+    archived rows fill up the remainder of the requested page. Pass the
+    created_at and id of the oldest entry already loaded as `before` and
+    `before_id` to fetch the next (older) page; the id breaks ties between
+    rows saved at the same instant. Entries keep created_at as a datetime;
+    the API response class serializes it.
+    """
     db = SessionLocal()
     
     try:
-        query = db.query(ChatHistoryDB).filter(
+        query = db.query(*_history_columns(ChatHistoryDB)).filter(
             ChatHistoryDB.user_id == user_id
-        ).order_by(ChatHistoryDB.created_at.desc())
+        )
+        if before:
+            query = query.filter(_older_than(ChatHistoryDB, before, before_id))
+        query = query.order_by(ChatHistoryDB.created_at.desc(), ChatHistoryDB.id.desc())
         
         # Apply limit if specified
         if limit:
             query = query.limit(limit)
         
-        chat_entries = query.all()
-        
-        history = []
-        for entry in chat_entries:
-            history.append({
-                "id": entry.id,
-                "message": entry.message,
-                "response": entry.response,
-                "tool_used": entry.tool_used,
-                "created_at": entry.created_at.isoformat()
-            })
+        history = _serialize_history(query.all())
+
+        if include_archived and (not limit or len(history) < limit):
+            archive_query = db.query(*_history_columns(ChatHistoryArchiveDB)).filter(
+                ChatHistoryArchiveDB.user_id == user_id
+            )
+            if before:
+                archive_query = archive_query.filter(_older_than(ChatHistoryArchiveDB, before, before_id))
+            archive_query = archive_query.order_by(ChatHistoryArchiveDB.created_at.desc(), ChatHistoryArchiveDB.id.desc())
+            if limit:
+                archive_query = archive_query.limit(limit - len(history))
+            history.extend(_serialize_history(archive_query.all()))
         
         return history
     finally:
         db.close()
 
 
-def clear_user_chat_history(user_id: str) -> bool:
-    """Delete all chat history for a user"""
+def _delete_in_chunks(model, user_id: str, batch_size: int) -> int:
+    """Delete a user's rows from a table, one short transaction per chunk"""
+    deleted = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            ids = [row.id for row in db.query(model.id).filter(
+                model.user_id == user_id
+            ).limit(batch_size).all()]
+
+            if not ids:
+                return deleted
+
+            db.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+            deleted += len(ids)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def _delete_daily_insights(user_id: str) -> None:
+    """Delete a user's daily mood and topic totals in one transaction (a few rows per day)"""
     db = SessionLocal()
-    
     try:
-        db.query(ChatHistoryDB).filter(ChatHistoryDB.user_id == user_id).delete()
+        db.query(InsightDailyDB).filter(InsightDailyDB.user_id == user_id).delete(synchronize_session=False)
+        db.query(TopicDailyDB).filter(TopicDailyDB.user_id == user_id).delete(synchronize_session=False)
         db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def clear_user_chat_history(user_id: str) -> bool:
+    """Delete all chat history for a user (hot and archived) and the insights derived from it"""
+    try:
+        _delete_in_chunks(ChatHistoryDB, user_id, CHAT_DELETE_BATCH_SIZE)
+        _delete_in_chunks(ChatHistoryArchiveDB, user_id, CHAT_DELETE_BATCH_SIZE)
+        _delete_in_chunks(MessageInsightDB, user_id, CHAT_DELETE_BATCH_SIZE)
+        _delete_daily_insights(user_id)
         return True
     except Exception as e:
-        db.rollback()
         return False
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month_start(value: datetime) -> datetime:
+    last_day = calendar.monthrange(value.year, value.month)[1]
+    return _month_start(value) + timedelta(days=last_day)
+
+
+def ensure_archive_partitions(db: Session, timestamps) -> None:
+    """Create monthly archive partitions covering the given timestamps (PostgreSQL only)"""
+    if engine.dialect.name != "postgresql":
+        return
+
+    for month in sorted({_month_start(ts) for ts in timestamps}):
+        db.execute(text(
+            f"CREATE TABLE IF NOT EXISTS chat_history_archive_{month:%Y_%m} "
+            f"PARTITION OF chat_history_archive "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month_start(month):%Y-%m-%d}')"
+        ))
+
+
+def archive_chat_history(retention_days: int = CHAT_RETENTION_DAYS, batch_size: int = CHAT_ARCHIVE_BATCH_SIZE) -> int:
+    """Move chat history older than the retention window to the archive table.
+
+    Rows are moved oldest first, one batch per transaction, so the hot table
+    is never locked for long. Returns the number of rows archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    archived = 0
+
+    while True:
+        db = SessionLocal()
+        try:
+            batch = db.query(ChatHistoryDB).filter(
+                ChatHistoryDB.created_at < cutoff
+            ).order_by(ChatHistoryDB.created_at).limit(batch_size).all()
+
+            if not batch:
+                return archived
+
+            ensure_archive_partitions(db, [entry.created_at for entry in batch])
+            db.execute(insert(ChatHistoryArchiveDB), [
+                {
+                    "id": entry.id,
+                    "created_at": entry.created_at,
+                    "user_id": entry.user_id,
+                    "message_data": entry.message_data,
+                    "response_data": entry.response_data,
+                    "tool_used": entry.tool_used,
+                }
+                for entry in batch
+            ])
+            db.query(ChatHistoryDB).filter(
+                ChatHistoryDB.id.in_([entry.id for entry in batch])
+            ).delete(synchronize_session=False)
+            db.commit()
+            archived += len(batch)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def prepare_compressed_history_columns() -> None:
+    """Convert legacy TEXT transcript columns to binary (PostgreSQL only).
+
+    SQLite stores the compressed bytes in the existing columns as-is.
+    Existing text is prefixed with the plain-text format byte so it stays readable.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+
+    with engine.begin() as conn:
+        for column in ("message", "response"):
+            data_type = conn.execute(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = 'chat_history' AND column_name = :column"
+            ), {"column": column}).scalar()
+            if data_type == "text":
+                conn.execute(text(
+                    f"ALTER TABLE chat_history ALTER COLUMN {column} TYPE bytea "
+                    f"USING '\\x00'::bytea || convert_to({column}, 'UTF8')"
+                ))
+
+
+def load_zstd_dictionary(dict_id: int) -> Optional[bytes]:
+    db = SessionLocal()
+    try:
+        return db.query(ZstdDictionaryDB.data).filter(ZstdDictionaryDB.dict_id == dict_id).scalar()
+    finally:
+        db.close()
+
+
+def get_active_zstd_dictionary_id() -> Optional[int]:
+    db = SessionLocal()
+    try:
+        return db.query(ZstdDictionaryDB.dict_id).filter(ZstdDictionaryDB.is_active.is_(True)).order_by(
+            ZstdDictionaryDB.created_at.desc()
+        ).limit(1).scalar()
+    finally:
+        db.close()
+
+
+def save_zstd_dictionary(dict_id: int, data: bytes, activate: bool = False) -> None:
+    """Store a dictionary (idempotent), optionally making it the one new rows use"""
+    db = SessionLocal()
+    try:
+        if activate:
+            db.query(ZstdDictionaryDB).filter(ZstdDictionaryDB.is_active.is_(True)).update(
+                {ZstdDictionaryDB.is_active: False}, synchronize_session=False
+            )
+        entry = db.get(ZstdDictionaryDB, dict_id)
+        if entry is None:
+            db.add(ZstdDictionaryDB(dict_id=dict_id, data=data, is_active=activate, created_at=datetime.utcnow()))
+        elif activate:
+            entry.is_active = True
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def drop_shared_state_counter() -> None:
+    """Drop the unused shared_state.counter column from older schemas.
+
+    It is NOT NULL without a server default, so inserts that no longer set
+    it would fail while it exists.
+    """
+    with engine.begin() as conn:
+        columns = {column["name"] for column in inspect(conn).get_columns("shared_state")}
+        if "counter" in columns:
+            conn.execute(text("ALTER TABLE shared_state DROP COLUMN counter"))
+
+
+def compress_chat_history(batch_size: int = 500) -> dict:
+    """Re-encode existing chat history rows in batches, committing per batch"""
+    prepare_compressed_history_columns()
+    # Fail before rewriting anything rather than write rows only this host can read
+    require_durable_dictionary()
+
+    scanned = 0
+    compressed = 0
+    last_id = ""
+
+    while True:
+        db = SessionLocal()
+        try:
+            batch = db.query(ChatHistoryDB).filter(
+                ChatHistoryDB.id > last_id
+            ).order_by(ChatHistoryDB.id).limit(batch_size).all()
+
+            if not batch:
+                break
+
+            for entry in batch:
+                if needs_reencoding(entry.message_data):
+                    entry.message_data = encode_text(entry.message)
+                    compressed += 1
+                if needs_reencoding(entry.response_data):
+                    entry.response_data = encode_text(entry.response)
+                    compressed += 1
+
+            db.commit()
+            scanned += len(batch)
+            last_id = batch[-1].id
+        finally:
+            db.close()
+
+    return {"rows_scanned": scanned, "values_rewritten": compressed}
+
+
+def chat_history_compression_report(sample_size: int = 1000) -> dict:
+    """Measure storage savings and codec overhead on a sample of chat history"""
+    db = SessionLocal()
+
+    try:
+        entries = db.query(ChatHistoryDB).order_by(
+            ChatHistoryDB.created_at.desc()
+        ).limit(sample_size).all()
+
+        texts = []
+        stored_bytes = 0
+        for entry in entries:
+            for value in (entry.message_data, entry.response_data):
+                stored_bytes += len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+            texts.extend([entry.message, entry.response])
+    finally:
+        db.close()
+
+    raw_bytes = sum(len(t.encode("utf-8")) for t in texts)
+
+    start = time.perf_counter()
+    encoded = [encode_text(t) for t in texts]
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for value in encoded:
+        decode_text(value)
+    decode_seconds = time.perf_counter() - start
+
+    encoded_bytes = sum(len(e) for e in encoded)
+    count = max(len(texts), 1)
+
+    return {
+        "values_sampled": len(texts),
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "encoded_bytes": encoded_bytes,
+        "size_reduction_pct": round(100 * (1 - encoded_bytes / raw_bytes), 1) if raw_bytes else 0.0,
+        "avg_encode_us": round(1e6 * encode_seconds / count, 2),
+        "avg_decode_us": round(1e6 * decode_seconds / count, 2),
+    }
+
+
+def chat_history_samples(limit: int = 2000) -> List[str]:
+    """Recent transcript texts, used to train the compression dictionary"""
+    db = SessionLocal()
+
+    try:
+        entries = db.query(ChatHistoryDB).order_by(
+            ChatHistoryDB.created_at.desc()
+        ).limit(limit).all()
+
+        samples = []
+        for entry in entries:
+            samples.extend([entry.message, entry.response])
+        return samples
+    finally:
+        db.close()
+
+
+def _increment_row(db: Session, model, keys: dict, increments: dict) -> None:
+    """Add to counter columns of the row identified by keys, inserting it if missing.
+
+    Raises IntegrityError if another writer inserted the row first; callers
+    roll back and retry, at which point the update path succeeds.
+    """
+    updated = db.query(model).filter_by(**keys).update(
+        {getattr(model, column): getattr(model, column) + amount for column, amount in increments.items()},
+        synchronize_session=False
+    )
+    if not updated:
+        db.add(model(**keys, **increments))
+        db.flush()
+
+
+def record_message_metrics(metrics: MessageMetrics, retries: int = 3) -> None:
+    """Store metrics for one message and fold them into the daily rollups"""
+    day = metrics.created_at.date()
+    rollup = {
+        "messages": 1,
+        "groq_prompt_tokens": metrics.groq_prompt_tokens,
+        "groq_completion_tokens": metrics.groq_completion_tokens,
+        "ollama_eval_count": metrics.ollama_eval_count,
+        "total_ms": metrics.total_ms,
+    }
+    bucket = latency_bucket(metrics.total_ms)
+
+    for attempt in range(retries):
+        db = SessionLocal()
+        try:
+            db.add(MessageMetricsDB(
+                chat_id=metrics.chat_id,
+                user_id=metrics.user_id,
+                created_at=metrics.created_at,
+                path=metrics.path,
+                groq_calls=metrics.groq_calls,
+                groq_prompt_tokens=metrics.groq_prompt_tokens,
+                groq_completion_tokens=metrics.groq_completion_tokens,
+                ollama_calls=metrics.ollama_calls,
+                ollama_prompt_eval_count=metrics.ollama_prompt_eval_count,
+                ollama_eval_count=metrics.ollama_eval_count,
+                ollama_prompt_eval_ms=metrics.ollama_prompt_eval_ms,
+                ollama_eval_ms=metrics.ollama_eval_ms,
+                ollama_total_ms=metrics.ollama_total_ms,
+                usage_ms=metrics.stage_ms.get("usage", 0),
+                agent_ms=metrics.stage_ms.get("agent", 0),
+                save_ms=metrics.stage_ms.get("save", 0),
+                total_ms=metrics.total_ms
+            ))
+            for scope in (metrics.user_id, "*"):
+                _increment_row(db, MetricsDailyRollupDB, {"scope": scope, "day": day}, rollup)
+                _increment_row(db, LatencyHistogramDB, {"scope": scope, "day": day, "bucket": bucket}, {"count": 1})
+            db.commit()
+            return
+        except IntegrityError:
+            db.rollback()
+            if attempt == retries - 1:
+                raise
+        finally:
+            db.close()
+
+
+def get_metrics_summary(scope: str, days: int = 30) -> dict:
+    """Latency percentiles and daily token totals from the rollups.
+
+    scope is a user id or "*" for all users. Cost depends on the number of
+    days requested, not on the number of messages.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    db = SessionLocal()
+
+    try:
+        rollups = db.query(MetricsDailyRollupDB).filter(
+            MetricsDailyRollupDB.scope == scope,
+            MetricsDailyRollupDB.day >= since
+        ).order_by(MetricsDailyRollupDB.day).all()
+
+        buckets = dict(db.query(LatencyHistogramDB.bucket, func.sum(LatencyHistogramDB.count)).filter(
+            LatencyHistogramDB.scope == scope,
+            LatencyHistogramDB.day >= since
+        ).group_by(LatencyHistogramDB.bucket).all())
+
+        return {
+            "days": days,
+            "messages": sum(r.messages for r in rollups),
+            "latency_p50_ms": percentile_from_buckets(buckets, 50),
+            "latency_p95_ms": percentile_from_buckets(buckets, 95),
+            "daily": [
+                {
+                    "day": r.day,
+                    "messages": r.messages,
+                    "groq_prompt_tokens": r.groq_prompt_tokens,
+                    "groq_completion_tokens": r.groq_completion_tokens,
+                    "ollama_eval_count": r.ollama_eval_count,
+                    "avg_latency_ms": r.total_ms // r.messages if r.messages else 0
+                }
+                for r in rollups
+            ]
+        }
+    finally:
+        db.close()
+
+
+def _apply_insights(db: Session, rows: list) -> None:
+    """Label (id, user_id, message text, created_at) rows and add them to the daily aggregates.
+
+    Aggregates are summed per (user, day) and (user, day, topic) first, so a
+    batch costs one update per group rather than one per message.
+    """
+    daily = {}
+    topics = {}
+    for chat_id, user_id, text, created_at in rows:
+        insight = analyze_message(text)
+        db.add(MessageInsightDB(
+            id=chat_id,
+            user_id=user_id,
+            created_at=created_at,
+            sentiment=insight.sentiment,
+            label=insight.label,
+            topics=",".join(insight.topics)
+        ))
+
+        day = created_at.date()
+        totals = daily.setdefault((user_id, day), dict.fromkeys(("messages", "sentiment_sum") + SENTIMENT_LABELS, 0))
+        totals["messages"] += 1
+        totals["sentiment_sum"] += insight.sentiment
+        totals[insight.label] += 1
+        for topic in insight.topics:
+            topics[(user_id, day, topic)] = topics.get((user_id, day, topic), 0) + 1
+    db.flush()
+
+    for (user_id, day), totals in daily.items():
+        _increment_row(db, InsightDailyDB, {"user_id": user_id, "day": day}, totals)
+    for (user_id, day, topic), count in topics.items():
+        _increment_row(db, TopicDailyDB, {"user_id": user_id, "day": day, "topic": topic}, {"count": count})
+
+
+def record_message_insight(chat_id: str, user_id: str, message: str,
+                           created_at: Optional[datetime] = None, retries: int = 3) -> None:
+    """Label one saved message and fold it into the user's daily insights (idempotent per chat id)"""
+    for attempt in range(retries):
+        db = SessionLocal()
+        try:
+            if db.query(MessageInsightDB.id).filter(MessageInsightDB.id == chat_id).first():
+                return
+            _apply_insights(db, [(chat_id, user_id, message, created_at or datetime.utcnow())])
+            db.commit()
+            return
+        except IntegrityError:
+            db.rollback()
+            if attempt == retries - 1:
+                raise
+        finally:
+            db.close()
+
+
+def backfill_insights(batch_size: int = 500, retries: int = 3) -> dict:
+    """Label chat history (hot and archived) that has no insights yet, one batch per transaction.
+
+    Only ids, user ids, timestamps and the message column are read, a batch
+    at a time, so memory stays bounded however large the history is.
+    """
+    scanned = 0
+    labelled = 0
+
+    for model in (ChatHistoryDB, ChatHistoryArchiveDB):
+        last_id = ""
+        while True:
+            for attempt in range(retries):
+                db = SessionLocal()
+                try:
+                    batch = db.query(model.id, model.user_id, model.message_data, model.created_at).filter(
+                        model.id > last_id
+                    ).order_by(model.id).limit(batch_size).all()
+                    if not batch:
+                        break
+
+                    ids = [row.id for row in batch]
+                    done = {row.id for row in db.query(MessageInsightDB.id).filter(MessageInsightDB.id.in_(ids))}
+                    rows = [
+                        (row.id, row.user_id, decode_text(row.message_data), row.created_at)
+                        for row in batch if row.id not in done
+                    ]
+                    if rows:
+                        _apply_insights(db, rows)
+                    db.commit()
+                    break
+                except IntegrityError:
+                    # A live message was labelled concurrently; redo the batch
+                    db.rollback()
+                    if attempt == retries - 1:
+                        raise
+                finally:
+                    db.close()
+
+            if not batch:
+                break
+            scanned += len(batch)
+            labelled += len(rows)
+            last_id = batch[-1].id
+
+    return {"messages_scanned": scanned, "messages_labelled": labelled}
+
+
+def get_user_insights(user_id: str, days: int = 30) -> dict:
+    """Mood and topic trends from the daily aggregates.
+
+    Cost depends on the number of days requested, not on the number of messages.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    db = SessionLocal()
+
+    try:
+        rollups = db.query(InsightDailyDB).filter(
+            InsightDailyDB.user_id == user_id,
+            InsightDailyDB.day >= since
+        ).order_by(InsightDailyDB.day).all()
+
+        topics_by_day = {}
+        for row in db.query(TopicDailyDB).filter(TopicDailyDB.user_id == user_id, TopicDailyDB.day >= since):
+            topics_by_day.setdefault(row.day, {})[row.topic] = row.count
+
+        top_topics = {}
+        for day_topics in topics_by_day.values():
+            for topic, count in day_topics.items():
+                top_topics[topic] = top_topics.get(topic, 0) + count
+
+        messages = sum(r.messages for r in rollups)
+        return {
+            "days": days,
+            "messages": messages,
+            "avg_sentiment": round(sum(r.sentiment_sum for r in rollups) / messages, 3) if messages else None,
+            "top_topics": dict(sorted(top_topics.items(), key=lambda item: item[1], reverse=True)),
+            "daily": [
+                {
+                    "day": r.day,
+                    "messages": r.messages,
+                    "avg_sentiment": round(r.sentiment_sum / r.messages, 3) if r.messages else None,
+                    "negative": r.negative,
+                    "neutral": r.neutral,
+                    "positive": r.positive,
+                    "topics": topics_by_day.get(r.day, {})
+                }
+                for r in rollups
+            ]
+        }
     finally:
         db.close()
@@ -1,7 +1,10 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
 import json
+from urllib.parse import urlencode
 
 # Try to load dotenv, but don't fail if not available
 try:
@@ -13,6 +16,10 @@ except ImportError:
 # Get BACKEND_URL
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
+HISTORY_PAGE_SIZE = 15
+# Only the most recent messages are rendered; older ones are shown on request
+MESSAGE_WINDOW = 30
+
 st.set_page_config(page_title="AI Mental Health Therapist", layout="wide")
 
 # Initialize session state
@@ -22,6 +29,43 @@ if "user" not in st.session_state:
     st.session_state.user = None
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
+if "history_pages" not in st.session_state:
+    st.session_state.history_pages = {}  # (created_at, id) cursor -> page from /chat/history
+if "history_cursor" not in st.session_state:
+    st.session_state.history_cursor = None  # cursor of the next older page, None when exhausted
+if "message_window" not in st.session_state:
+    st.session_state.message_window = MESSAGE_WINDOW
+
+
+@st.cache_resource
+def get_http_adapter():
+    """Connection pool shared by all users: keeps connections to the backend alive between reruns.
+
+    Idempotent requests are retried on connection errors and 502/503/504;
+    POST /ask is never retried so a message can't be sent twice.
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=["GET", "DELETE"]
+    )
+    return HTTPAdapter(max_retries=retry, pool_connections=4, pool_maxsize=16)
+
+
+def get_http_session():
+    """This user's HTTP session over the shared connection pool.
+
+    Each browser session gets its own requests.Session so cookies set on one
+    user's responses (e.g. load balancer stickiness) are never sent for another.
+    """
+    if "http_session" not in st.session_state:
+        session = requests.Session()
+        adapter = get_http_adapter()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        st.session_state.http_session = session
+    return st.session_state.http_session
 
 
 def make_authenticated_request(endpoint, method="GET", data=None):
@@ -33,11 +77,14 @@ def make_authenticated_request(endpoint, method="GET", data=None):
     
     try:
         url = f"{BACKEND_URL}{endpoint}"
+        session = get_http_session()
         
         if method == "POST":
-            response = requests.post(url, json=data, headers=headers, timeout=30)
+            response = session.post(url, json=data, headers=headers, timeout=30)
+        elif method == "DELETE":
+            response = session.delete(url, headers=headers, timeout=10)
         else:
-            response = requests.get(url, headers=headers, timeout=30)
+            response = session.get(url, headers=headers, timeout=30)
         
         response.raise_for_status()
         return response.json()
@@ -74,7 +121,7 @@ def login_page():
                 if login_btn:
                     if email and password:
                         try:
-                            response = requests.post(f"{BACKEND_URL}/auth/login", 
+                            response = get_http_session().post(f"{BACKEND_URL}/auth/login", 
                                                    json={"email": email, "password": password})
                             
                             if response.status_code == 200:
@@ -105,7 +152,7 @@ def login_page():
                             if reg_name:
                                 payload["full_name"] = reg_name
                                 
-                            response = requests.post(f"{BACKEND_URL}/auth/register", json=payload)
+                            response = get_http_session().post(f"{BACKEND_URL}/auth/register", json=payload)
                             if response.status_code == 200:
                                 data = response.json()
                                 st.session_state.token = data["access_token"]
@@ -121,6 +168,60 @@ def login_page():
                         st.error("Email and password are required")
 
 
+def reset_history_cache():
+    """Forget all cached history pages (after clearing history or logging out)"""
+    st.session_state.history_pages = {}
+    st.session_state.history_cursor = None
+
+
+def invalidate_latest_history_page():
+    """A new message changes the newest page; older pages stay valid"""
+    st.session_state.history_pages.pop("latest", None)
+
+
+def fetch_history_page(cursor=None):
+    """Get one page of history, newest first, from the cache or the backend.
+
+    Archived rows are included: the backend only reads the archive once the
+    hot table runs out, so "load older" continues into archived months.
+    """
+    key = cursor or "latest"
+    if key not in st.session_state.history_pages:
+        params = {"limit": HISTORY_PAGE_SIZE, "include_archived": "true"}
+        if cursor:
+            params["before"], params["before_id"] = cursor
+        endpoint = f"/chat/history?{urlencode(params)}"
+        page = make_authenticated_request(endpoint)
+        if page is None:
+            return None
+        st.session_state.history_pages[key] = page
+    return st.session_state.history_pages[key]
+
+
+def next_history_cursor(page):
+    """(created_at, id) of the page's oldest entry, or None when there is nothing older"""
+    if not page.get("next_cursor"):
+        return None
+    return page["next_cursor"], page["next_cursor_id"]
+
+
+def page_to_messages(page):
+    """Convert a history page (newest first) into chat messages (oldest first)"""
+    messages = []
+    for msg in reversed(page["history"]):
+        messages.append({"role": "user", "content": msg["message"]})
+        messages.append({"role": "assistant", "content": msg["response"]})
+    return messages
+
+
+def logout():
+    st.session_state.token = None
+    st.session_state.user = None
+    st.session_state.chat_history = []
+    st.session_state.message_window = MESSAGE_WINDOW
+    reset_history_cache()
+
+
 def chat_page():
     """Main chat interface"""
     # Header with user info and logout
@@ -131,9 +232,7 @@ def chat_page():
             st.caption(f"Welcome, {st.session_state.user.get('full_name', st.session_state.user['email'])}!")
     with col2:
         if st.button("Logout"):
-            st.session_state.token = None
-            st.session_state.user = None
-            st.session_state.chat_history = []
+            logout()
             st.rerun()
     
     # Display welcome message if no chat history
@@ -143,39 +242,57 @@ def chat_page():
     # History control buttons
     col1, col2 = st.columns(2)
     with col1:
-        if st.button("📚 Load Last 15 Messages"):
-            history_data = make_authenticated_request("/chat/history?limit=15")
+        if st.button(f"📚 Load Last {HISTORY_PAGE_SIZE} Messages"):
+            history_data = fetch_history_page()
             if history_data:
-                st.session_state.chat_history = []
-                for msg in history_data["history"]:
-                    st.session_state.chat_history.append({"role": "user", "content": msg["message"]})
-                    st.session_state.chat_history.append({"role": "assistant", "content": msg["response"]})
-                st.success("✅ Loaded last 15 messages")
+                st.session_state.chat_history = page_to_messages(history_data)
+                st.session_state.history_cursor = next_history_cursor(history_data)
+                st.session_state.message_window = MESSAGE_WINDOW
+                st.success(f"✅ Loaded last {HISTORY_PAGE_SIZE} messages")
                 st.rerun()
     
     with col2:
         if st.button("🗑️ Clear History"):
             if st.session_state.chat_history:
-                try:
-                    response = requests.delete(
-                        f"{BACKEND_URL}/chat/history",
-                        headers={
-                            "Authorization": f"Bearer {st.session_state.token}",
-                            "Content-Type": "application/json"
-                        },
-                        timeout=10
-                    )
-                    if response.status_code == 200:
-                        st.session_state.chat_history = []
-                        st.success("✅ Chat history cleared!")
-                        st.rerun()
-                    else:
-                        st.error("❌ Failed to clear history")
-                except requests.exceptions.RequestException as e:
-                    st.error(f"❌ Error: {str(e)}")
-    
-    # Display chat history
-    for msg in st.session_state.chat_history:
+                if make_authenticated_request("/chat/history", "DELETE") is not None:
+                    st.session_state.chat_history = []
+                    reset_history_cache()
+                    st.success("✅ Chat history cleared!")
+                    st.rerun()
+                else:
+                    st.error("❌ Failed to clear history")
+
+    chat_area()
+
+
+def _fragment(func):
+    # Streamlit fragments rerun only the decorated function on interaction
+    return st.fragment(func) if hasattr(st, "fragment") else func
+
+
+@_fragment
+def chat_area():
+    """Chat messages and input; reruns on its own when a message is sent"""
+    hidden = max(0, len(st.session_state.chat_history) - st.session_state.message_window)
+
+    # Older messages: reveal ones already loaded, then fetch older pages from the backend
+    if hidden or st.session_state.history_cursor:
+        if st.button("⬆️ Show earlier messages"):
+            if hidden:
+                st.session_state.message_window += MESSAGE_WINDOW
+            else:
+                page = fetch_history_page(st.session_state.history_cursor)
+                if page:
+                    older = page_to_messages(page)
+                    st.session_state.chat_history = older + st.session_state.chat_history
+                    st.session_state.history_cursor = next_history_cursor(page)
+                    st.session_state.message_window += len(older)
+
+    history = st.session_state.chat_history
+    hidden = max(0, len(history) - st.session_state.message_window)
+
+    # Display chat history (only the visible window)
+    for msg in history[hidden:]:
         with st.chat_message(msg["role"]):
             st.write(msg["content"])
     
@@ -183,18 +300,25 @@ def chat_page():
     user_input = st.chat_input("What's on your mind today?")
     
     if user_input:
-        # Add user message to chat
+        # Render just the new messages; the rest of the page is left as is
+        with st.chat_message("user"):
+            st.write(user_input)
         st.session_state.chat_history.append({"role": "user", "content": user_input})
         
         # Get AI response
-        response_data = make_authenticated_request("/ask", "POST", {"message": user_input})
+        with st.spinner("Thinking..."):
+            response_data = make_authenticated_request("/ask", "POST", {"message": user_input})
         if response_data:
             ai_response = response_data["response"]
-            st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
         else:
-            st.session_state.chat_history.append({"role": "assistant", "content": "Sorry, I'm having technical difficulties. Please try again."})
-        
-        st.rerun()
+            ai_response = "Sorry, I'm having technical difficulties. Please try again."
+
+        with st.chat_message("assistant"):
+            st.write(ai_response)
+        st.session_state.chat_history.append({"role": "assistant", "content": ai_response})
+
+        if response_data:
+            invalidate_latest_history_page()
 
 
 # Main app routing
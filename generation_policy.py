@@ -0,0 +1,232 @@
+"""Adaptive MedGemma generation budgets.
+
+Each specialist call gets a token budget (num_predict) and stop sequences
+chosen from the user's message: a one-line "thanks" needs far fewer tokens
+than a long disclosure. Budgets are also capped so that the expected
+generation time stays within MEDGEMMA_LATENCY_SLO_MS, using moving averages
+of the decode rate and prompt evaluation time Ollama reports.
+
+While streaming, generation is stopped at the first sentence boundary once
+most of the budget is used, instead of running to num_predict and cutting
+a sentence in half. Every call logs tokens generated against tokens kept.
+"""
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Optional
+
+from config import (
+    MEDGEMMA_ADAPTIVE_GENERATION,
+    MEDGEMMA_EARLY_STOP_FRACTION,
+    MEDGEMMA_LATENCY_SLO_MS,
+    MEDGEMMA_MAX_TOKENS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Keep the model from writing the user's next turn
+BASE_STOP = ["\nUser:", "\nPatient:", "\n\n\n"]
+
+CRISIS_PATTERN = re.compile(
+    r"\b(suicid\w*|kill (my|him|her)self|end (my|it) (life|all)|self[- ]harm\w*|hurt(ing)? myself|"
+    r"want to die|don'?t want to (live|be here)|overdose)\b", re.I
+)
+ACKNOWLEDGEMENT_PATTERN = re.compile(
+    r"^\W*(thanks?( you)?|thank u|thx|ok(ay)?|cool|great|got it|bye|goodbye|good night|hi|hello|hey|"
+    r"yes|no|sure|alright|sounds good)\b", re.I
+)
+QUESTION_PATTERN = re.compile(r"\?\s*$|^\s*(how|what|why|when|where|which|who|can|could|should|is|are|do|does)\b", re.I)
+SENTENCE_END = re.compile(r"[.!?][\"')\]]?\s*$")
+NOT_SENTENCE_END = re.compile(r"(\b\d+|\b(dr|mr|mrs|ms|e\.g|i\.e|etc|vs))\.\s*$", re.I)
+
+
+@dataclass(frozen=True)
+class IntentBudget:
+    min_tokens: int
+    max_tokens: int
+    tokens_per_word: float
+    stop: tuple = ()
+    early_stop: bool = True
+    slo_cap: bool = True
+
+
+INTENT_BUDGETS = {
+    "acknowledgement": IntentBudget(48, 96, 4.0, stop=("\n\n",)),
+    "question": IntentBudget(120, 280, 3.0),
+    "disclosure": IntentBudget(160, 350, 2.0),
+    # Never shortened: an emergency call may be in progress
+    "crisis": IntentBudget(350, 350, 0.0, early_stop=False, slo_cap=False),
+}
+
+
+@dataclass
+class GenerationPlan:
+    intent: str
+    num_predict: int
+    stop: List[str]
+    # Stop at the next sentence boundary after this many tokens (None streams to the end)
+    soft_limit: Optional[int]
+
+    def options(self, base: dict) -> dict:
+        return {**base, "num_predict": self.num_predict, "stop": self.stop}
+
+
+def classify_intent(message: str) -> str:
+    """Rough intent of a message: crisis, acknowledgement, question or disclosure"""
+    if CRISIS_PATTERN.search(message):
+        return "crisis"
+    words = len(message.split())
+    if words <= 6 and ACKNOWLEDGEMENT_PATTERN.search(message):
+        return "acknowledgement"
+    if words <= 40 and QUESTION_PATTERN.search(message):
+        return "question"
+    return "disclosure"
+
+
+def at_sentence_boundary(text: str) -> bool:
+    return bool(SENTENCE_END.search(text)) and not NOT_SENTENCE_END.search(text)
+
+
+def trim_to_sentence(text: str) -> str:
+    """Drop a trailing partial sentence left by hitting num_predict"""
+    stripped = text.rstrip()
+    if at_sentence_boundary(stripped):
+        return stripped
+    ends = [m.end() for m in re.finditer(r"[.!?][\"')\]]?(?=\s)", stripped)]
+    return stripped[:ends[-1]] if ends else stripped
+
+
+@dataclass
+class IntentStats:
+    calls: int = 0
+    budget: int = 0
+    generated: int = 0
+    used: int = 0
+    early_stops: int = 0
+    truncated: int = 0
+
+
+@dataclass
+class GenerationPolicy:
+    """Plans MedGemma generations and learns decode speed from their results"""
+    latency_slo_ms: float = MEDGEMMA_LATENCY_SLO_MS
+    max_tokens: int = MEDGEMMA_MAX_TOKENS
+    early_stop_fraction: float = MEDGEMMA_EARLY_STOP_FRACTION
+    enabled: bool = MEDGEMMA_ADAPTIVE_GENERATION
+    smoothing: float = 0.2
+    decode_tokens_per_s: Optional[float] = None
+    prompt_eval_ms: Optional[float] = None
+    stats: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def slo_token_cap(self) -> Optional[int]:
+        """Most tokens that fit in the latency SLO at the observed decode rate"""
+        if not self.decode_tokens_per_s:
+            return None
+        decode_ms = self.latency_slo_ms - (self.prompt_eval_ms or 0)
+        return max(0, int(decode_ms / 1000 * self.decode_tokens_per_s))
+
+    def plan(self, message: str) -> GenerationPlan:
+        if not self.enabled:
+            return GenerationPlan("fixed", self.max_tokens, list(BASE_STOP), None)
+
+        intent = classify_intent(message)
+        budget = INTENT_BUDGETS[intent]
+        tokens = budget.min_tokens + int(len(message.split()) * budget.tokens_per_word)
+        tokens = min(max(tokens, budget.min_tokens), budget.max_tokens, self.max_tokens)
+
+        cap = self.slo_token_cap() if budget.slo_cap else None
+        if cap is not None:
+            tokens = max(min(tokens, cap), min(budget.min_tokens, self.max_tokens))
+
+        soft_limit = int(tokens * self.early_stop_fraction) if budget.early_stop else None
+        return GenerationPlan(intent, tokens, list(BASE_STOP) + list(budget.stop), soft_limit)
+
+    def _smooth(self, current: Optional[float], value: float) -> float:
+        return value if current is None else self.smoothing * value + (1 - self.smoothing) * current
+
+    def observe(self, plan: GenerationPlan, response, text: str, used_text: str) -> None:
+        """Update decode-rate averages and log how much of the generation was used"""
+        generated = response.get("eval_count") or 0
+        eval_ns = response.get("eval_duration") or 0
+        # Only Ollama's own measurement; early-stopped responses have none
+        prompt_ns = response.get("prompt_eval_duration") or 0
+        used = round(generated * len(used_text) / len(text)) if text else 0
+        reason = response.get("done_reason") or "stop"
+
+        with self._lock:
+            if generated and eval_ns:
+                self.decode_tokens_per_s = self._smooth(self.decode_tokens_per_s, generated / (eval_ns / 1e9))
+            if prompt_ns:
+                self.prompt_eval_ms = self._smooth(self.prompt_eval_ms, prompt_ns / 1e6)
+
+            stats = self.stats.setdefault(plan.intent, IntentStats())
+            stats.calls += 1
+            stats.budget += plan.num_predict
+            stats.generated += generated
+            stats.used += used
+            stats.early_stops += reason == "early_stop"
+            stats.truncated += reason == "length"
+
+        logger.info(
+            "MedGemma generation intent=%s budget=%d generated=%d used=%d wasted=%d reason=%s",
+            plan.intent, plan.num_predict, generated, used, generated - used, reason
+        )
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "decode_tokens_per_s": self.decode_tokens_per_s,
+                "prompt_eval_ms": self.prompt_eval_ms,
+                "slo_token_cap": self.slo_token_cap(),
+                "intents": {intent: vars(s).copy() for intent, s in self.stats.items()},
+            }
+
+
+async def collect_stream(stream, plan: GenerationPlan) -> dict:
+    """Read a streamed Ollama chat, stopping at a sentence boundary past the soft limit.
+
+    Returns a response shaped like a non-streamed one. Closing the stream
+    early makes Ollama stop generating, so the saved decode time is real.
+    Early-stopped responses have estimated counts (see below).
+    """
+    text = ""
+    chunks = 0
+    started = time.perf_counter()
+    first_token = None
+
+    async for part in stream:
+        if part.get("done"):
+            return {**dict(part), "message": {"role": "assistant", "content": text + part["message"]["content"]}}
+
+        text += part["message"]["content"]
+        chunks += 1
+        if first_token is None:
+            first_token = time.perf_counter()
+
+        if plan.soft_limit is not None and chunks >= plan.soft_limit and at_sentence_boundary(text):
+            await stream.aclose()
+            break
+
+    # Stopped early: Ollama's final statistics never arrive, so estimate what we can.
+    # Ollama streams one token per chunk, so the chunk count stands in for eval_count.
+    # The wait for the first chunk mixes prompt evaluation with queueing and network
+    # time, so no prompt_eval_duration is reported rather than a misleading one.
+    now = time.perf_counter()
+    first_token = first_token or now
+    return {
+        "message": {"role": "assistant", "content": text},
+        "done_reason": "early_stop",
+        "eval_count": chunks,
+        "eval_duration": int((now - first_token) * 1e9),
+        "total_duration": int((now - started) * 1e9),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_generation_policy() -> GenerationPolicy:
+    """Policy shared by all MedGemma calls in this worker"""
+    return GenerationPolicy()
@@ -0,0 +1,100 @@
+"""Cheap local mood and topic labels for chat messages.
+
+Labels come from small word lists, not a model, so they can be computed
+for every message right after it is saved and for the whole history in a
+backfill. They describe trends across many messages; a single label is
+only a rough signal.
+"""
+import re
+from dataclasses import dataclass
+from typing import List
+
+POSITIVE_WORDS = {
+    "better": 1.0, "calm": 1.0, "calmer": 1.0, "confident": 1.0, "enjoy": 1.0, "enjoyed": 1.0,
+    "excited": 1.0, "glad": 1.0, "good": 0.5, "grateful": 1.0, "great": 1.0, "happy": 1.0,
+    "helped": 1.0, "helpful": 1.0, "hope": 0.5, "hopeful": 1.0, "improving": 1.0, "love": 1.0,
+    "loved": 1.0, "motivated": 1.0, "okay": 0.5, "peaceful": 1.0, "proud": 1.0, "relaxed": 1.0,
+    "relieved": 1.0, "safe": 0.5, "supported": 1.0, "thank": 0.5, "thanks": 0.5, "well": 0.5,
+}
+NEGATIVE_WORDS = {
+    "afraid": 1.0, "alone": 1.0, "angry": 1.0, "anxious": 1.0, "ashamed": 1.0, "awful": 1.0,
+    "bad": 0.5, "broken": 1.0, "crying": 1.0, "depressed": 1.5, "desperate": 1.5, "die": 1.5,
+    "empty": 1.0, "exhausted": 1.0, "failure": 1.0, "guilty": 1.0, "hate": 1.0, "hopeless": 1.5,
+    "hurt": 1.0, "isolated": 1.0, "lonely": 1.0, "lost": 0.5, "miserable": 1.5, "nervous": 1.0,
+    "numb": 1.0, "overwhelmed": 1.0, "panic": 1.0, "sad": 1.0, "scared": 1.0, "stressed": 1.0,
+    "suicidal": 2.0, "terrible": 1.0, "tired": 0.5, "upset": 1.0, "worried": 1.0, "worthless": 1.5,
+}
+NEGATIONS = {"not", "no", "never", "dont", "don't", "cant", "can't", "isnt", "isn't", "wasnt", "wasn't", "hardly"}
+INTENSIFIERS = {"very": 1.5, "really": 1.5, "so": 1.3, "extremely": 2.0, "totally": 1.5, "always": 1.3}
+
+TOPIC_KEYWORDS = {
+    "anxiety": {"anxious", "anxiety", "panic", "nervous", "worried", "worry", "fear", "afraid", "overthinking"},
+    "low_mood": {"depressed", "depression", "sad", "hopeless", "empty", "numb", "crying", "miserable"},
+    "crisis": {"suicide", "suicidal", "die", "self-harm", "cutting", "overdose", "kill"},
+    "sleep": {"sleep", "insomnia", "tired", "exhausted", "nightmares", "awake", "rest"},
+    "relationships": {"partner", "boyfriend", "girlfriend", "husband", "wife", "breakup", "relationship", "dating"},
+    "family": {"mom", "mother", "dad", "father", "parents", "family", "sister", "brother", "kids", "children"},
+    "work_study": {"work", "job", "boss", "career", "exam", "exams", "school", "college", "university", "study"},
+    "loneliness": {"lonely", "alone", "isolated", "friends", "friendless"},
+    "grief": {"grief", "grieving", "died", "death", "loss", "passed", "funeral"},
+    "self_esteem": {"worthless", "failure", "ugly", "ashamed", "confidence", "useless", "hate myself"},
+    "stress": {"stress", "stressed", "overwhelmed", "pressure", "burnout", "deadline"},
+}
+GENERAL_TOPIC = "general"
+
+SENTIMENT_LABELS = ("negative", "neutral", "positive")
+# Scores at or beyond these are labelled negative / positive
+NEGATIVE_THRESHOLD = -0.2
+POSITIVE_THRESHOLD = 0.2
+
+_WORD = re.compile(r"[a-z']+(?:-[a-z]+)?")
+
+
+@dataclass
+class MessageInsight:
+    sentiment: float  # -1 (very negative) .. 1 (very positive)
+    label: str        # negative | neutral | positive
+    topics: List[str]
+
+
+def sentiment_score(words: List[str]) -> float:
+    """Lexicon score in [-1, 1] with simple negation and intensifier handling"""
+    total = 0.0
+    weight = 0.0
+    for i, word in enumerate(words):
+        value = POSITIVE_WORDS.get(word, 0.0) - NEGATIVE_WORDS.get(word, 0.0)
+        if not value:
+            continue
+        previous = words[max(0, i - 3):i]
+        if any(w in NEGATIONS for w in previous):
+            value = -value * 0.5  # "not happy" is negative, but less than "sad"
+        if i and words[i - 1] in INTENSIFIERS:
+            value *= INTENSIFIERS[words[i - 1]]
+        total += value
+        weight += abs(value)
+    return round(total / max(weight, 2.0), 3) if weight else 0.0
+
+
+def label_for(score: float) -> str:
+    if score <= NEGATIVE_THRESHOLD:
+        return "negative"
+    if score >= POSITIVE_THRESHOLD:
+        return "positive"
+    return "neutral"
+
+
+def detect_topics(text: str, words: List[str]) -> List[str]:
+    vocabulary = set(words)
+    topics = [
+        topic for topic, keywords in TOPIC_KEYWORDS.items()
+        if any((k in text) if " " in k else (k in vocabulary) for k in keywords)
+    ]
+    return topics or [GENERAL_TOPIC]
+
+
+def analyze_message(text: str) -> MessageInsight:
+    """Sentiment and topic labels for what the user wrote"""
+    lowered = text.lower()
+    words = _WORD.findall(lowered)
+    score = sentiment_score(words)
+    return MessageInsight(sentiment=score, label=label_for(score), topics=detect_topics(lowered, words))
@@ -0,0 +1,195 @@
+"""Load-balanced pool of LLM endpoints (Ollama hosts) for the specialist tool.
+
+Requests go to the available endpoint with the fewest requests in flight.
+An endpoint that fails OLLAMA_EJECT_AFTER_FAILURES times in a row is
+ejected for OLLAMA_EJECT_SECONDS; after that it gets trial traffic again
+and is re-admitted on its first success. Background health checks probe
+every endpoint so that ejected hosts come back (and dead ones go away)
+without waiting for user requests.
+
+Clients are created by a factory, so tests and benchmarks can plug in fake
+endpoints instead of ollama.AsyncClient.
+"""
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, List, Optional
+
+from config import (
+    OLLAMA_EJECT_AFTER_FAILURES,
+    OLLAMA_EJECT_SECONDS,
+    OLLAMA_HEALTH_INTERVAL_SECONDS,
+    OLLAMA_HEALTH_TIMEOUT_SECONDS,
+    OLLAMA_HOSTS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def ollama_client_factory(host: Optional[str]):
+    """Async Ollama client for a host (None uses OLLAMA_HOST or localhost)"""
+    import ollama
+
+    return ollama.AsyncClient(host=host)
+
+
+class Endpoint:
+    """One LLM host with its client, load and health state"""
+
+    def __init__(self, host: Optional[str], client: Any):
+        self.host = host
+        self.client = client
+        # Per-endpoint setup already done by callers (e.g. derived models created);
+        # setup_lock makes concurrent first requests do it once
+        self.prepared = set()
+        self.setup_lock = asyncio.Lock()
+        # Setup that failed, and when callers may try it again
+        self.setup_retry_at = {}
+        self.outstanding = 0
+        self.peak_outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_at = 0.0
+        self.ejected_until = 0.0
+        self.total_ms = 0.0
+        self.last_error = None
+
+    @property
+    def name(self) -> str:
+        return self.host or "default"
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def stats(self, now: float) -> dict:
+        completed = self.requests - self.outstanding
+        return {
+            "host": self.name,
+            "available": self.available(now),
+            "outstanding": self.outstanding,
+            "peak_outstanding": self.peak_outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections,
+            "avg_latency_ms": round(self.total_ms / completed, 1) if completed else None,
+            "last_error": self.last_error,
+        }
+
+
+class ProviderPool:
+    """Least-outstanding-requests balancer with passive and active health checking"""
+
+    def __init__(
+        self,
+        hosts: List[Optional[str]],
+        client_factory: Callable[[Optional[str]], Any] = ollama_client_factory,
+        eject_after: int = OLLAMA_EJECT_AFTER_FAILURES,
+        eject_seconds: float = OLLAMA_EJECT_SECONDS,
+        health_timeout: float = OLLAMA_HEALTH_TIMEOUT_SECONDS,
+    ):
+        if not hosts:
+            raise ValueError("A provider pool needs at least one host")
+        self.endpoints = [Endpoint(host, client_factory(host)) for host in hosts]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.health_timeout = health_timeout
+
+    def _pick(self, exclude: set) -> Endpoint:
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e.available(now) and e not in exclude]
+        if not candidates:
+            # Everything is ejected: try the endpoint that comes back first rather than failing outright
+            candidates = sorted(
+                (e for e in self.endpoints if e not in exclude), key=lambda e: e.ejected_until
+            )[:1] or self.endpoints[:1]
+        return min(candidates, key=lambda e: (e.outstanding, e.requests))
+
+    def _record_success(self, endpoint: Endpoint, started: float) -> None:
+        if started < endpoint.ejected_at:
+            return  # In flight before the endpoint was ejected; says nothing about its health now
+        if endpoint.ejected_until:
+            logger.info("LLM endpoint %s re-admitted", endpoint.name)
+        endpoint.consecutive_failures = 0
+        endpoint.ejected_until = 0.0
+
+    def record_failure(self, endpoint: Endpoint, error: Exception) -> None:
+        """Count a failure against an endpoint (ejecting it after eject_after in a row)"""
+        endpoint.failures += 1
+        endpoint.consecutive_failures += 1
+        endpoint.last_error = f"{type(error).__name__}: {error}"
+        if endpoint.consecutive_failures >= self.eject_after:
+            if endpoint.available(time.monotonic()):
+                endpoint.ejections += 1
+                endpoint.ejected_at = time.monotonic()
+                logger.warning("LLM endpoint %s ejected after %d failures: %s",
+                               endpoint.name, endpoint.consecutive_failures, endpoint.last_error)
+            endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    async def call(self, fn: Callable[[Endpoint], Awaitable[Any]], attempts: int = 2) -> Any:
+        """Run fn(endpoint) on the least loaded endpoint, retrying once on a different one"""
+        tried = set()
+        error = None
+        for _ in range(min(attempts, len(self.endpoints))):
+            endpoint = self._pick(tried)
+            tried.add(endpoint)
+
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            endpoint.peak_outstanding = max(endpoint.peak_outstanding, endpoint.outstanding)
+            started = time.monotonic()
+            try:
+                result = await fn(endpoint)
+            except Exception as e:
+                self.record_failure(endpoint, e)
+                error = e
+                continue
+            finally:
+                endpoint.outstanding -= 1
+                endpoint.total_ms += (time.monotonic() - started) * 1000
+            self._record_success(endpoint, started)
+            return result
+        raise error
+
+    async def _probe(self, endpoint: Endpoint) -> None:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(endpoint.client.list(), timeout=self.health_timeout)
+        except Exception as e:
+            # A failed probe ejects straight away; user requests should not find dead hosts
+            endpoint.consecutive_failures = max(endpoint.consecutive_failures, self.eject_after - 1)
+            self.record_failure(endpoint, e)
+        else:
+            if endpoint.consecutive_failures or endpoint.ejected_until:
+                self._record_success(endpoint, started)
+
+    async def check_health(self) -> None:
+        """Probe every endpoint once"""
+        await asyncio.gather(*(self._probe(e) for e in self.endpoints))
+
+    async def run_health_checks(self, interval_seconds: float = OLLAMA_HEALTH_INTERVAL_SECONDS) -> None:
+        while True:
+            try:
+                await self.check_health()
+            except Exception:
+                logger.exception("LLM endpoint health check failed")
+            await asyncio.sleep(interval_seconds)
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [e.stats(now) for e in self.endpoints]
+
+
+@lru_cache(maxsize=1)
+def get_provider_pool() -> ProviderPool:
+    """Pool over OLLAMA_HOSTS (or the default Ollama host), one per worker"""
+    return ProviderPool(OLLAMA_HOSTS or [None])
+
+
+def start_health_checks() -> asyncio.Task | None:
+    """Start background health checks when more than one host is configured"""
+    if len(OLLAMA_HOSTS) < 2 or OLLAMA_HEALTH_INTERVAL_SECONDS <= 0:
+        return None
+    return asyncio.create_task(get_provider_pool().run_health_checks())
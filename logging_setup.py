@@ -0,0 +1,218 @@
+"""Non-blocking structured logging.
+
+Request handlers only put records on a bounded in-memory queue; a
+background thread formats them (JSON by default) and writes them to
+stdout. When the queue is full, records are dropped and counted rather
+than making a request wait on stdout.
+
+- Every record carries the id of the request it was logged in (see
+  request_id_middleware in main.py), or "-" outside a request.
+- LOG_LEVELS sets levels per module ("ai_agent=DEBUG,llm_pool=WARNING").
+- LOG_SAMPLING keeps only a fraction of a module's DEBUG/INFO records
+  ("ai_agent=0.1"); warnings and errors are always kept.
+- Chat content passed as extra fields (prompt, response, content, ...) is
+  replaced by its length, and emails, phone numbers and bearer tokens are
+  masked in every message.
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from config import LOG_FORMAT, LOG_LEVEL, LOG_LEVELS, LOG_QUEUE_SIZE, LOG_SAMPLING
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Extra fields that may hold what users wrote or what we answered
+REDACTED_FIELDS = {"response", "content", "prompt", "query", "answer", "password", "token"}
+REDACT_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"), "[email]"),
+    (re.compile(r"(?i)bearer\s+[\w.-]+"), "Bearer [token]"),
+    # Only real phone shapes, so dates, timestamps, ids and durations stay readable
+    (re.compile(
+        r"(?<![\w+.:/-])(?:"
+        r"\+\d(?:[ .-]?\(?\d\)?){7,14}"                 # international: +44 20 7946 0958
+        r"|(?:\(\d{3}\)\s?|\d{3}[ .-])\d{3}[ .-]\d{4}"  # grouped 3-3-4: (555) 123-4567
+        r"|0\d{2,4}[ -]\d{3,4}[ -]?\d{3,4}"             # national trunk prefix: 07700 900123
+        r")(?![\w.:/-]?\d)"
+    ), "[phone]"),
+]
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+_listener: Optional["DrainingQueueListener"] = None
+_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def redact_text(text: str) -> str:
+    for pattern, replacement in REDACT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    fields = {}
+    for key, value in vars(record).items():
+        if key in _RECORD_FIELDS or key.startswith("_"):
+            continue
+        if key in REDACTED_FIELDS and value is not None:
+            value = f"[redacted {len(str(value))} chars]"
+        fields[key] = value
+    return fields
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": redact_text(record.getMessage()),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = redact_text(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record):
+        line = redact_text(super().format(record))
+        fields = _extra_fields(record)
+        return f"{line} {json.dumps(fields, default=str)}" if fields else line
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of DEBUG/INFO records per logger name prefix"""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        name = record.name
+        while name:
+            if name in self.rates:
+                return random.random() < self.rates[name]
+            name = name.rpartition(".")[0]
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that never blocks the caller and keeps its own cost counters"""
+
+    def __init__(self, maxsize: int):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.enqueued = 0
+        self.dropped = 0
+        self.enqueue_ns = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        # Runs on the request thread: resolve what depends on it, leave formatting to the listener.
+        # Other handlers may still see the caller's record, so only the copy is changed.
+        record = copy.copy(record)
+        record.request_id = request_id_var.get()
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self.queue.put_nowait(record)
+
+    def emit(self, record):
+        start = time.perf_counter_ns()
+        try:
+            self.enqueue(self.prepare(record))
+            dropped = 0
+        except queue.Full:
+            dropped = 1
+        except Exception:
+            self.handleError(record)
+            return
+        elapsed = time.perf_counter_ns() - start
+        with self._lock:
+            self.enqueued += 1 - dropped
+            self.dropped += dropped
+            self.enqueue_ns += elapsed
+
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self.enqueued + self.dropped
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "avg_enqueue_us": round(self.enqueue_ns / calls / 1000, 2) if calls else None,
+            }
+
+
+class DrainingQueueListener(QueueListener):
+    """Queue listener whose stop() waits for room in a full queue instead of failing"""
+
+    def __init__(self, queue_, *handlers, sentinel_timeout: float = 5.0, **kwargs):
+        super().__init__(queue_, *handlers, **kwargs)
+        self.sentinel_timeout = sentinel_timeout
+
+    def enqueue_sentinel(self):
+        # The writer thread is still draining, so a slot frees up; put_nowait would raise queue.Full
+        self.queue.put(self._sentinel, timeout=self.sentinel_timeout)
+
+
+def _parse_mapping(value: str) -> dict:
+    """"a=1,b.c=2" -> {"a": "1", "b.c": "2"}"""
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {name.strip(): setting.strip() for name, setting in pairs}
+
+
+def setup_logging() -> None:
+    """Route all logging through the background writer (once per process)"""
+    global _listener, _handler
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    _handler = NonBlockingQueueHandler(LOG_QUEUE_SIZE)
+    _handler.addFilter(SamplingFilter({name: float(rate) for name, rate in _parse_mapping(LOG_SAMPLING).items()}))
+
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(LOG_LEVEL)
+    for name, level in _parse_mapping(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = DrainingQueueListener(_handler.queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def logging_stats() -> dict:
+    """Request-path cost of logging in this process"""
+    if _handler is None:
+        return {"enqueued": 0, "dropped": 0, "queue_depth": 0, "queue_size": 0, "avg_enqueue_us": None}
+    return _handler.stats()
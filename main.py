@@ -1,13 +1,39 @@
-from fastapi import FastAPI, HTTPException, status, Depends
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import List, Optional
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request, status, Depends
+from fastapi import Query as QueryParam
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 import uvicorn
 
 
 # Import our modules
-from ai_agent import graph, SYSTEM_PROMPT, parse_response
-from models import UserCreate, UserLogin, Token, User
-from auth import create_access_token, get_current_user
+# ai_agent (langchain, Groq, Ollama, Twilio) is imported on the first /ask request
+from config import AGENT_RECORD_DIR, AUTO_MIGRATE, WARMUP_ON_STARTUP
+from models import (
+    UserCreate,
+    UserLogin,
+    Token,
+    User,
+    AskResponse,
+    CacheStats,
+    ChatHistoryResponse,
+    InsightsSummary,
+    LLMEndpointStats,
+    LoggingStats,
+    MessageResponse,
+    MetricsSummary,
+    ProvisionResponse,
+    UsageResponse,
+    UsageSummary
+)
+from auth import create_access_token, get_admin_user, get_current_user
+from cache import cache_stats
+from message_metrics import start_message_metrics
+from provisioning import parse_records, provision_users
 from database import (
     create_user, 
     authenticate_user, 
@@ -16,11 +42,46 @@ from database import (
     get_user_chat_history,
     get_user_usage, 
     increment_user_usage,
-    clear_user_chat_history  # ← Added this import
+    clear_user_chat_history,  # ← Added this import
+    get_metrics_summary,
+    get_user_insights,
+    record_message_insight,
+    init_db,
+    record_message_metrics
 )
+from archival import start_archiver
+from llm_pool import get_provider_pool, start_health_checks
+from usage_rollover import start_usage_rollover
+from logging_setup import logging_stats, new_request_id, request_id_var, setup_logging
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start logging and background jobs; schema setup only runs here when AUTO_MIGRATE is set"""
+    # Here rather than at import, so importing main (tests, scripts) leaves the root logger alone
+    setup_logging()
 
+    if AUTO_MIGRATE:
+        init_db()
 
-app = FastAPI(title="SafeSpace AI Mental Health API")
+    if WARMUP_ON_STARTUP:
+        from ai_agent import warm_up
+        await asyncio.to_thread(warm_up)
+
+    archiver = start_archiver()
+    health_checks = start_health_checks()
+    usage_rollover = start_usage_rollover()
+    yield
+    for task in (archiver, health_checks, usage_rollover):
+        if task:
+            task.cancel()
+
+
+app = FastAPI(
+    title="SafeSpace AI Mental Health API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
 
 
 # Add CORS middleware for frontend
@@ -36,6 +97,19 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag log records with a request id (taken from X-Request-ID when the proxy sets one)"""
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
 # Request model
 class Query(BaseModel):
     message: str
@@ -76,80 +150,166 @@ async def get_me(current_user: dict = Depends(get_current_user)):
     return user
 
 
+# Admin endpoints
+@app.post("/admin/users/bulk", response_model=ProvisionResponse)
+async def bulk_provision_users(request: Request, current_user: dict = Depends(get_admin_user)):
+    """Create many user accounts from a CSV (text/csv) or NDJSON body (admin only)"""
+    content_type = request.headers.get("content-type", "")
+    fmt = "csv" if "csv" in content_type else "ndjson"
+    
+    try:
+        records = parse_records((await request.body()).decode("utf-8"), fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse {fmt} body: {e}")
+    
+    return await asyncio.to_thread(provision_users, records)
+
+
 # Protected chat endpoint
-@app.post("/ask")
-async def ask(query: Query, current_user: dict = Depends(get_current_user)):
+@app.post("/ask", response_model=AskResponse)
+async def ask(
+    query: Query,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user)
+):
     """Chat with AI agent (requires authentication)"""
+    from ai_agent import get_graph, SYSTEM_PROMPT, aparse_response
+
+    metrics = start_message_metrics(current_user["user_id"])
     
     # Increment usage
-    usage_after = increment_user_usage(current_user["user_id"])
+    with metrics.stage("usage"):
+        usage_after = increment_user_usage(current_user["user_id"])
     
     # AI agent processing
-    inputs = {"messages": [("system", SYSTEM_PROMPT), ("user", query.message)]}
-    stream = graph.stream(inputs, stream_mode="updates")
-    tool_called_name, final_response = parse_response(stream)
+    with metrics.stage("agent"):
+        inputs = {"messages": [("system", SYSTEM_PROMPT), ("user", query.message)]}
+        stream = get_graph().astream(inputs, stream_mode="updates")
+        if AGENT_RECORD_DIR:
+            from agent_replay import record_stream
+            stream = record_stream(stream, query.message, SYSTEM_PROMPT, AGENT_RECORD_DIR)
+        tool_called_name, final_response = await aparse_response(stream)
     
     # Save to user's chat history
-    save_chat_message(
-        user_id=current_user["user_id"],
-        message=query.message,
-        response=final_response, 
-        tool_used=tool_called_name
-    )
+    with metrics.stage("save"):
+        chat_id, created_at = save_chat_message(
+            user_id=current_user["user_id"],
+            message=query.message,
+            response=final_response, 
+            tool_used=tool_called_name
+        )
+
+    # Token/latency accounting is written after the response is sent
+    metrics.finish(chat_id, tool_called_name)
+    background_tasks.add_task(record_message_metrics, metrics)
+    # Same timestamp as the saved row, so the message is counted on the day it was stored
+    background_tasks.add_task(record_message_insight, chat_id, current_user["user_id"], query.message, created_at)
     
-    return {
-        "response": final_response, 
-        "tool_used": tool_called_name,
-        "usage": {
-            "messages_used": usage_after["messages_used_this_month"],
-            "messages_limit": 50
-        }
-    }
+    return AskResponse(
+        response=final_response,
+        tool_used=tool_called_name,
+        usage=UsageSummary(
+            messages_used=usage_after["messages_used_this_month"],
+            messages_limit=50
+        )
+    )
+
+
+# Metrics endpoints
+@app.get("/metrics/me", response_model=MetricsSummary)
+async def get_my_metrics(days: int = QueryParam(30, ge=1, le=366), current_user: dict = Depends(get_current_user)):
+    """Latency percentiles and token usage per day for the current user"""
+    return get_metrics_summary(current_user["user_id"], days=days)
+
+
+@app.get("/metrics/global", response_model=MetricsSummary)
+async def get_global_metrics(days: int = QueryParam(30, ge=1, le=366), current_user: dict = Depends(get_admin_user)):
+    """Latency percentiles and token usage per day across all users (admin only)"""
+    return get_metrics_summary("*", days=days)
+
+
+@app.get("/metrics/cache", response_model=List[CacheStats])
+async def get_cache_metrics(current_user: dict = Depends(get_admin_user)):
+    """Hit ratios of this worker's user and usage caches (admin only)"""
+    return cache_stats()
+
+
+@app.get("/metrics/llm", response_model=List[LLMEndpointStats])
+async def get_llm_metrics(current_user: dict = Depends(get_admin_user)):
+    """Load, latency and health of each Ollama host in this worker's pool (admin only)"""
+    return get_provider_pool().stats()
+
+
+@app.get("/metrics/logging", response_model=LoggingStats)
+async def get_logging_metrics(current_user: dict = Depends(get_admin_user)):
+    """Records logged, dropped and the average request-path cost in this worker (admin only)"""
+    return logging_stats()
+
+
+# Insights endpoints
+@app.get("/insights", response_model=InsightsSummary)
+async def get_my_insights(days: int = QueryParam(30, ge=1, le=366), current_user: dict = Depends(get_current_user)):
+    """Mood and topic trends per day for the current user"""
+    return get_user_insights(current_user["user_id"], days=days)
+
+
+@app.get("/insights/{user_id}", response_model=InsightsSummary)
+async def get_insights_for_user(user_id: str, days: int = QueryParam(30, ge=1, le=366), current_user: dict = Depends(get_admin_user)):
+    """Mood and topic trends per day for any user (admin only)"""
+    return get_user_insights(user_id, days=days)
 
 
 # Chat history endpoints
-@app.get("/chat/history")
+@app.get("/chat/history", response_model=ChatHistoryResponse)
 async def get_chat_history_endpoint(
     limit: int = None,
+    include_archived: bool = False,
+    before: Optional[datetime] = None,
+    before_id: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get user's chat history with optional limit"""
-    history = get_user_chat_history(current_user["user_id"], limit=limit)
-    return {"history": history}
+    """Get user's chat history with optional limit, paged with the `before`/`before_id` cursor"""
+    history = get_user_chat_history(
+        current_user["user_id"], limit=limit, include_archived=include_archived,
+        before=before, before_id=before_id
+    )
+    last = history[-1] if limit and len(history) == limit else None
+    # Rows are already in the response shape, so skip re-validation and encode directly
+    return ORJSONResponse({
+        "history": history,
+        "next_cursor": last and last["created_at"],
+        "next_cursor_id": last and last["id"],
+    })
 
 
-@app.delete("/chat/history")
+@app.delete("/chat/history", response_model=MessageResponse)
 async def clear_chat_history_endpoint(current_user: dict = Depends(get_current_user)):
     """Clear all chat history for current user"""
     success = clear_user_chat_history(current_user["user_id"])
     if success:
-        return {"message": "Chat history cleared successfully"}
+        return MessageResponse(message="Chat history cleared successfully")
     else:
         raise HTTPException(status_code=500, detail="Failed to clear chat history")
 
 
 # Usage statistics
-@app.get("/usage")
+@app.get("/usage", response_model=UsageResponse)
 async def get_usage_stats(current_user: dict = Depends(get_current_user)):
     """Get current user's usage statistics"""
-    from datetime import datetime, timezone
-    
     usage = get_user_usage(current_user["user_id"])
     
-    # Calculate days remaining in current period
-    now = datetime.now(timezone.utc)
-    period_end = usage["current_period_end"]
-    if isinstance(period_end, str):
-        period_end = datetime.fromisoformat(period_end.replace('Z', '+00:00'))
+    # Usage timestamps are stored as naive UTC
+    now = datetime.utcnow()
+    period_end = datetime.fromisoformat(usage["current_period_end"])
     
     days_remaining = (period_end - now).days
     
-    return {
-        "messages_used": usage["messages_used_this_month"],
-        "messages_limit": 50,
-        "period_ends": period_end.isoformat(),
-        "days_remaining": max(0, days_remaining)
-    }
+    return UsageResponse(
+        messages_used=usage["messages_used_this_month"],
+        messages_limit=50,
+        period_ends=period_end.replace(tzinfo=timezone.utc),
+        days_remaining=max(0, days_remaining)
+    )
 
 
 # Health check
@@ -0,0 +1,139 @@
+"""SafeSpace maintenance commands.
+
+Usage:
+    python manage.py migrate
+    python manage.py train-dictionary [--samples 2000] [--size 16384]
+    python manage.py compress-history [--batch-size 500]
+    python manage.py compression-report [--sample 1000]
+    python manage.py archive-history [--retention-days 90] [--batch-size 500]
+    python manage.py provision-users FILE [--workers N] [--batch-size 500] [--output results.ndjson]
+    python manage.py rollover-usage
+    python manage.py backfill-insights [--batch-size 500]
+"""
+import argparse
+import json
+
+from config import CHAT_ARCHIVE_BATCH_SIZE, CHAT_RETENTION_DAYS
+
+
+def migrate_command(args):
+    from database import init_db
+
+    init_db()
+    print("Database schema is up to date")
+
+
+def train_dictionary_command(args):
+    from chat_codec import train_dictionary
+    from database import chat_history_samples
+
+    samples = chat_history_samples(limit=args.samples)
+    if not samples:
+        print("No chat history to train on")
+        return
+    try:
+        dict_id = train_dictionary(samples, dict_size=args.size)
+    except ValueError as e:
+        print(e)
+        return
+    print(f"Trained dictionary {dict_id} from {len(samples)} samples")
+
+
+def compress_history_command(args):
+    from database import compress_chat_history
+
+    try:
+        report = compress_chat_history(batch_size=args.batch_size)
+    except RuntimeError as e:
+        raise SystemExit(f"compress-history aborted: {e}")
+    print(json.dumps(report, indent=2))
+
+
+def compression_report_command(args):
+    from database import chat_history_compression_report
+
+    print(json.dumps(chat_history_compression_report(sample_size=args.sample), indent=2))
+
+
+def archive_history_command(args):
+    from database import archive_chat_history
+
+    archived = archive_chat_history(retention_days=args.retention_days, batch_size=args.batch_size)
+    print(f"Archived {archived} chat history rows")
+
+
+def provision_users_command(args):
+    from provisioning import provision_users, read_records
+
+    report = provision_users(read_records(args.file), workers=args.workers, batch_size=args.batch_size)
+    results = report.pop("results")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+    else:
+        for result in results:
+            if result["status"] != "created":
+                print(f"row {result['row']}: {result['email']} {result['status']} - {result['error']}")
+
+    print(json.dumps(report, indent=2))
+
+
+def rollover_usage_command(args):
+    from database import rollover_usage_periods
+
+    print(f"Reset monthly usage for {rollover_usage_periods()} users")
+
+
+def backfill_insights_command(args):
+    from database import backfill_insights
+
+    print(json.dumps(backfill_insights(batch_size=args.batch_size), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SafeSpace maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser("migrate", help="Create missing tables and upgrade columns")
+    migrate.set_defaults(func=migrate_command)
+
+    train = subparsers.add_parser("train-dictionary", help="Train the zstd dictionary for chat transcripts")
+    train.add_argument("--samples", type=int, default=2000, help="Number of recent messages to sample")
+    train.add_argument("--size", type=int, default=16 * 1024, help="Dictionary size in bytes")
+    train.set_defaults(func=train_dictionary_command)
+
+    compress = subparsers.add_parser("compress-history", help="Compress existing chat history rows")
+    compress.add_argument("--batch-size", type=int, default=500)
+    compress.set_defaults(func=compress_history_command)
+
+    report = subparsers.add_parser("compression-report", help="Show chat history compression savings")
+    report.add_argument("--sample", type=int, default=1000)
+    report.set_defaults(func=compression_report_command)
+
+    archive = subparsers.add_parser("archive-history", help="Move old chat history to the archive table")
+    archive.add_argument("--retention-days", type=int, default=CHAT_RETENTION_DAYS)
+    archive.add_argument("--batch-size", type=int, default=CHAT_ARCHIVE_BATCH_SIZE)
+    archive.set_defaults(func=archive_history_command)
+
+    provision = subparsers.add_parser("provision-users", help="Create user accounts from a CSV or NDJSON file")
+    provision.add_argument("file", help="CSV (email,password,full_name) or NDJSON file")
+    provision.add_argument("--workers", type=int, default=None, help="Password hashing processes (default: PROVISION_HASH_WORKERS)")
+    provision.add_argument("--batch-size", type=int, default=500, help="Users inserted per transaction")
+    provision.add_argument("--output", help="Write per-row results to this NDJSON file")
+    provision.set_defaults(func=provision_users_command)
+
+    rollover = subparsers.add_parser("rollover-usage", help="Reset monthly usage for users whose period has ended")
+    rollover.set_defaults(func=rollover_usage_command)
+
+    insights = subparsers.add_parser("backfill-insights", help="Label existing chat history for /insights")
+    insights.add_argument("--batch-size", type=int, default=500)
+    insights.set_defaults(func=backfill_insights_command)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
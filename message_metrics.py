@@ -0,0 +1,106 @@
+"""Per-message token and latency accounting for /ask.
+
+A MessageMetrics object is bound to the request through a context variable,
+so the agent stream parser and the MedGemma tool can add their numbers
+without having them passed around explicitly.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional
+
+# Latency histogram bucket upper bounds (ms) used by the rollups; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [
+    100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 5000,
+    7500, 10000, 15000, 20000, 30000, 45000, 60000, 120000
+]
+
+_current_metrics: ContextVar[Optional["MessageMetrics"]] = ContextVar("message_metrics", default=None)
+
+
+@dataclass
+class MessageMetrics:
+    user_id: str
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    chat_id: Optional[str] = None
+    path: str = "None"
+    groq_calls: int = 0
+    groq_prompt_tokens: int = 0
+    groq_completion_tokens: int = 0
+    ollama_calls: int = 0
+    ollama_prompt_eval_count: int = 0
+    ollama_eval_count: int = 0
+    ollama_prompt_eval_ms: int = 0
+    ollama_eval_ms: int = 0
+    ollama_total_ms: int = 0
+    stage_ms: dict = field(default_factory=dict)
+    total_ms: int = 0
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage of the request (usage, agent, save, ...)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_ms[name] = self.stage_ms.get(name, 0) + int((time.perf_counter() - start) * 1000)
+
+    def add_groq_message(self, message) -> None:
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            self.groq_calls += 1
+            self.groq_prompt_tokens += usage.get("input_tokens", 0)
+            self.groq_completion_tokens += usage.get("output_tokens", 0)
+
+    def add_ollama_response(self, response) -> None:
+        self.ollama_calls += 1
+        self.ollama_prompt_eval_count += response.get("prompt_eval_count") or 0
+        self.ollama_eval_count += response.get("eval_count") or 0
+        self.ollama_prompt_eval_ms += (response.get("prompt_eval_duration") or 0) // 1_000_000
+        self.ollama_eval_ms += (response.get("eval_duration") or 0) // 1_000_000
+        self.ollama_total_ms += (response.get("total_duration") or 0) // 1_000_000
+
+    def finish(self, chat_id: Optional[str], path: str) -> None:
+        self.chat_id = chat_id
+        self.path = path
+        self.total_ms = int((time.perf_counter() - self._started) * 1000)
+
+
+def start_message_metrics(user_id: str) -> MessageMetrics:
+    """Create metrics for the current request and make them current"""
+    metrics = MessageMetrics(user_id=user_id)
+    _current_metrics.set(metrics)
+    return metrics
+
+
+def current_metrics() -> Optional[MessageMetrics]:
+    """Metrics of the request being handled, if any"""
+    return _current_metrics.get()
+
+
+def latency_bucket(total_ms: int) -> int:
+    """Index of the histogram bucket for a latency"""
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if total_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def percentile_from_buckets(counts: dict, percentile: float) -> Optional[int]:
+    """Approximate a latency percentile (ms) from {bucket index: count}"""
+    total = sum(counts.values())
+    if not total:
+        return None
+
+    threshold = total * percentile / 100
+    seen = 0
+    for index in sorted(counts):
+        seen += counts[index]
+        if seen >= threshold:
+            if index < len(LATENCY_BUCKETS_MS):
+                return LATENCY_BUCKETS_MS[index]
+            return LATENCY_BUCKETS_MS[-1]
+    return LATENCY_BUCKETS_MS[-1]
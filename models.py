@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, field_validator
-from typing import Optional
-from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from datetime import date, datetime, timezone
 
 # Authentication Models
 class UserCreate(BaseModel):
@@ -56,8 +56,117 @@ class Token(BaseModel):
 # Chat Models  
 class ChatMessage(BaseModel):
     id: str
-    user_id: str
+    user_id: Optional[str] = None
     message: str
     response: str
     tool_used: Optional[str]
     created_at: datetime
+
+class ChatHistoryResponse(BaseModel):
+    history: List[ChatMessage]
+    # Pass as `before` and `before_id` to load older messages
+    next_cursor: Optional[datetime] = None
+    next_cursor_id: Optional[str] = None
+
+class UsageSummary(BaseModel):
+    messages_used: int
+    messages_limit: int
+
+class AskResponse(BaseModel):
+    response: Optional[str]
+    tool_used: str
+    usage: UsageSummary
+
+class MessageResponse(BaseModel):
+    message: str
+
+
+# Metrics Models
+class DailyMetrics(BaseModel):
+    day: date
+    messages: int
+    groq_prompt_tokens: int
+    groq_completion_tokens: int
+    ollama_eval_count: int
+    avg_latency_ms: int
+
+class MetricsSummary(BaseModel):
+    days: int
+    messages: int
+    latency_p50_ms: Optional[int]
+    latency_p95_ms: Optional[int]
+    daily: List[DailyMetrics]
+
+
+# Insights Models
+class DailyInsights(BaseModel):
+    day: date
+    messages: int
+    avg_sentiment: Optional[float]
+    negative: int
+    neutral: int
+    positive: int
+    topics: Dict[str, int]
+
+class InsightsSummary(BaseModel):
+    days: int
+    messages: int
+    avg_sentiment: Optional[float]
+    top_topics: Dict[str, int]
+    daily: List[DailyInsights]
+
+
+# Provisioning Models
+class ProvisionResult(BaseModel):
+    row: int
+    email: Optional[str]
+    status: str  # created | duplicate | invalid
+    error: Optional[str] = None
+    user_id: Optional[str] = None
+
+class ProvisionResponse(BaseModel):
+    total: int
+    created: int
+    duplicates: int
+    invalid: int
+    hash_seconds: float
+    insert_seconds: float
+    total_seconds: float
+    rows_per_second: Optional[float]
+    results: List[ProvisionResult]
+
+
+# Cache Models
+class CacheStats(BaseModel):
+    name: str
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    hit_ratio: float
+    db_queries_saved: int
+    evictions: int
+    invalidations: int
+
+
+# LLM Pool Models
+class LLMEndpointStats(BaseModel):
+    host: str
+    available: bool
+    outstanding: int
+    peak_outstanding: int
+    requests: int
+    failures: int
+    ejections: int
+    avg_latency_ms: Optional[float]
+    last_error: Optional[str]
+
+
+# Logging Models
+class LoggingStats(BaseModel):
+    enqueued: int
+    dropped: int
+    queue_depth: int
+    queue_size: int
+    avg_enqueue_us: Optional[float]
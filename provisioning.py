@@ -0,0 +1,183 @@
+"""Bulk user provisioning for partner clinic cohorts.
+
+Records come from CSV (header: email,password,full_name) or NDJSON (one JSON
+object per line with the same keys). Passwords are hashed in a process pool,
+existing accounts are detected with set-based queries, and users are
+inserted together with their usage rows in batched transactions.
+
+Small batches are hashed in the calling thread; larger ones go to one
+process pool per API worker (PROVISION_HASH_WORKERS processes), started on
+first use and reused by later requests.
+"""
+import atexit
+import csv
+import io
+import json
+import multiprocessing
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
+
+from auth import hash_password
+from config import PROVISION_HASH_WORKERS, PROVISION_PARALLEL_MIN_ROWS
+from database import bulk_create_users, find_existing_emails
+from models import UserCreate
+
+
+def parse_records(data: str, fmt: str) -> List[dict]:
+    """Parse CSV or NDJSON text into raw records"""
+    if fmt == "csv":
+        return [dict(row) for row in csv.DictReader(io.StringIO(data))]
+    if fmt == "ndjson":
+        records = []
+        for number, line in enumerate(data.splitlines(), start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError(f"line {number}: expected a JSON object, got {type(record).__name__}")
+            records.append(record)
+        return records
+    raise ValueError(f"Unsupported format: {fmt}")
+
+
+def read_records(path: str) -> List[dict]:
+    """Read records from a .csv or .ndjson/.jsonl file"""
+    fmt = "csv" if path.lower().endswith(".csv") else "ndjson"
+    with open(path, encoding="utf-8") as f:
+        return parse_records(f.read(), fmt)
+
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_pool_lock = threading.Lock()
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    """Hashing pool shared by all provisioning requests in this worker"""
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            # spawn: forking a threaded server process is unsafe
+            _hash_pool = ProcessPoolExecutor(max_workers=PROVISION_HASH_WORKERS,
+                                             mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_hash_pool.shutdown)
+        return _hash_pool
+
+
+def _hash_passwords(passwords: List[str], workers: Optional[int]) -> List[str]:
+    """Hash in-thread for small batches, otherwise in a process pool.
+
+    An explicit worker count (the CLI) gets its own pool for the call;
+    requests share the per-worker pool.
+    """
+    if len(passwords) < PROVISION_PARALLEL_MIN_ROWS or (workers or PROVISION_HASH_WORKERS) <= 1:
+        return [hash_password(p) for p in passwords]
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            return list(pool.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+    chunksize = max(1, len(passwords) // (PROVISION_HASH_WORKERS * 4))
+    return list(_get_hash_pool().map(hash_password, passwords, chunksize=chunksize))
+
+
+def _validate(records: Iterable[dict], results: List[dict]) -> List[tuple]:
+    """Validate records, recording failures; returns (row, UserCreate) for valid, unique rows"""
+    valid = []
+    seen = set()
+
+    for row, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            results.append({"row": row, "email": None, "status": "invalid",
+                            "error": f"Expected an object, got {type(record).__name__}"})
+            continue
+        try:
+            user = UserCreate(
+                email=record.get("email"),
+                password=record.get("password") or "",
+                full_name=record.get("full_name") or None
+            )
+        except ValidationError as e:
+            email = record.get("email")
+            # Report what was sent even when it is not a string (e.g. {"email": 123})
+            results.append({"row": row, "email": None if email is None else str(email), "status": "invalid",
+                            "error": "; ".join(err["msg"] for err in e.errors())})
+            continue
+
+        if user.email in seen:
+            results.append({"row": row, "email": user.email, "status": "duplicate",
+                            "error": "Duplicate email in input"})
+            continue
+        seen.add(user.email)
+        valid.append((row, user))
+
+    return valid
+
+
+def _insert_batch(batch: List[tuple], results: List[dict]) -> int:
+    """Insert one batch; if it conflicts (concurrent signups), retry row by row"""
+    users = [user for _, user in batch]
+    try:
+        bulk_create_users(users)
+        statuses = [(row, user, "created", None) for row, user in batch]
+    except IntegrityError:
+        statuses = []
+        for row, user in batch:
+            try:
+                bulk_create_users([user])
+                statuses.append((row, user, "created", None))
+            except IntegrityError:
+                statuses.append((row, user, "duplicate", "User with this email already exists"))
+
+    for row, user, status, error in statuses:
+        results.append({"row": row, "email": user["email"], "status": status, "error": error,
+                        "user_id": user["id"] if status == "created" else None})
+    return sum(1 for status in statuses if status[2] == "created")
+
+
+def provision_users(records: List[dict], workers: Optional[int] = None, batch_size: int = 500) -> dict:
+    """Create accounts for many users at once, returning per-row results and timings"""
+    started = time.perf_counter()
+    results = []
+
+    valid = _validate(records, results)
+
+    existing = find_existing_emails([user.email for _, user in valid])
+    pending = []
+    for row, user in valid:
+        if user.email in existing:
+            results.append({"row": row, "email": user.email, "status": "duplicate",
+                            "error": "User with this email already exists"})
+        else:
+            pending.append((row, user))
+
+    hash_started = time.perf_counter()
+    hashes = _hash_passwords([user.password for _, user in pending], workers)
+    hash_seconds = time.perf_counter() - hash_started
+
+    insert_started = time.perf_counter()
+    created = 0
+    prepared = [
+        (row, {"id": str(uuid.uuid4()), "email": user.email, "full_name": user.full_name, "password_hash": password_hash})
+        for (row, user), password_hash in zip(pending, hashes)
+    ]
+    for i in range(0, len(prepared), batch_size):
+        created += _insert_batch(prepared[i:i + batch_size], results)
+    insert_seconds = time.perf_counter() - insert_started
+
+    total_seconds = time.perf_counter() - started
+    results.sort(key=lambda r: r["row"])
+    return {
+        "total": len(records),
+        "created": created,
+        "duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+        "invalid": sum(1 for r in results if r["status"] == "invalid"),
+        "hash_seconds": round(hash_seconds, 3),
+        "insert_seconds": round(insert_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "rows_per_second": round(len(records) / total_seconds, 1) if total_seconds else None,
+        "results": results,
+    }
@@ -0,0 +1,45 @@
+"""Production entry point: several uvicorn worker processes behind one socket.
+
+Usage:
+    python serve.py [--workers N] [--host 0.0.0.0] [--port 8000]
+
+- Each worker is started with WARMUP_ON_STARTUP enabled, so the agent graph
+  and tool clients are built before the worker accepts traffic.
+- SIGTERM/SIGINT drains in-flight requests for up to GRACEFUL_SHUTDOWN_SECONDS.
+- SIGHUP restarts the workers one by one (e.g. after a deploy).
+- Cross-worker state (background job leases) goes through
+  shared_state, so run it with SHARED_STATE_BACKEND=database (the default).
+"""
+import argparse
+import os
+
+import uvicorn
+
+from config import GRACEFUL_SHUTDOWN_SECONDS, SHARED_STATE_BACKEND, WEB_CONCURRENCY
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the SafeSpace API with multiple workers")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    args = parser.parse_args()
+
+    if args.workers > 1 and SHARED_STATE_BACKEND == "local":
+        raise SystemExit("SHARED_STATE_BACKEND=local is not safe with more than one worker")
+
+    # Inherited by the worker processes
+    os.environ.setdefault("WARMUP_ON_STARTUP", "true")
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""State shared between API worker processes.
+
+Anything that must stay correct when the API runs with several workers
+(today: leases that let one worker run each background job) goes through a
+SharedStore instead of module-level variables. DatabaseStore keeps the
+state in the application database; LocalStore is an in-process stand-in
+for single-process development.
+"""
+import os
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Optional
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from config import SHARED_STATE_BACKEND
+from database import SessionLocal, SharedStateDB
+
+# Identifies this worker process as a lease owner
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SharedStore(ABC):
+    """Interface for state shared by API workers"""
+
+    @abstractmethod
+    def acquire_lease(self, name: str, owner: str = WORKER_ID, ttl: float = 60) -> bool:
+        """Take or renew a named lease; only one owner holds it until it expires"""
+
+
+class LocalStore(SharedStore):
+    """In-process store; only correct with a single worker"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._data.get(key)
+        if entry and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]):
+        return time.monotonic() + ttl if ttl else None
+
+    def acquire_lease(self, name, owner=WORKER_ID, ttl=60):
+        with self._lock:
+            entry = self._live(name)
+            if entry and entry[0] != owner:
+                return False
+            self._data[name] = (owner, self._expiry(ttl))
+            return True
+
+
+class DatabaseStore(SharedStore):
+    """Store backed by the shared_state table in the application database"""
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[datetime]:
+        return datetime.utcnow() + timedelta(seconds=ttl) if ttl else None
+
+    def _insert(self, db, key, value, ttl) -> bool:
+        """Insert a fresh row, replacing an expired one; False if a live row exists"""
+        now = datetime.utcnow()
+        db.query(SharedStateDB).filter(
+            SharedStateDB.key == key, SharedStateDB.expires_at <= now
+        ).delete(synchronize_session=False)
+        db.add(SharedStateDB(key=key, value=value, expires_at=self._expiry(ttl)))
+        try:
+            db.commit()
+            return True
+        except IntegrityError:
+            db.rollback()
+            return False
+
+    def acquire_lease(self, name, owner=WORKER_ID, ttl=60):
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            renewed = db.query(SharedStateDB).filter(
+                SharedStateDB.key == name,
+                or_(SharedStateDB.value == owner, SharedStateDB.expires_at <= now)
+            ).update({
+                SharedStateDB.value: owner,
+                SharedStateDB.expires_at: self._expiry(ttl)
+            }, synchronize_session=False)
+            if renewed:
+                db.commit()
+                return True
+            return self._insert(db, name, owner, ttl)
+        finally:
+            db.close()
+
+
+@lru_cache(maxsize=1)
+def get_shared_store() -> SharedStore:
+    """Configured store (SHARED_STATE_BACKEND=database|local)"""
+    if SHARED_STATE_BACKEND == "local":
+        return LocalStore()
+    return DatabaseStore()
@@ -0,0 +1,23 @@
+import pytest
+
+from models import ProvisionResult
+from provisioning import _validate, parse_records
+
+
+def test_parse_records_rejects_non_object_ndjson_rows():
+    with pytest.raises(ValueError, match="line 2: expected a JSON object"):
+        parse_records('{"email": "a@example.com"}\n[1, 2]', "ndjson")
+
+
+def test_validate_reports_non_object_rows_as_invalid():
+    results = []
+    assert _validate([[1, 2]], results) == []
+    assert results[0]["status"] == "invalid"
+    ProvisionResult(**results[0])
+
+
+def test_validate_reports_non_string_email_as_invalid():
+    results = []
+    assert _validate([{"email": 123, "password": "secret123"}], results) == []
+    assert results[0] == {**results[0], "row": 1, "email": "123", "status": "invalid"}
+    ProvisionResult(**results[0])
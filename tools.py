@@ -1,12 +1,25 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Optional
+from config import (
+    MEDGEMMA_BAKED_MODEL,
+    MEDGEMMA_BAKED_RETRY_SECONDS,
+    MEDGEMMA_KEEP_ALIVE,
+    MEDGEMMA_MAX_TOKENS,
+    MEDGEMMA_PREFIX_MODE,
+)
+from generation_policy import GenerationPlan, collect_stream, get_generation_policy, trim_to_sentence
+from llm_pool import get_provider_pool
+from message_metrics import current_metrics
+
+logger = logging.getLogger(__name__)
+
 # Step1: Setup Ollama with Medgemma tool
-import ollama
+# ollama and twilio are imported on first use so that importing this module stays cheap
 
-def query_medgemma(prompt: str) -> str:
-    """
-    Calls MedGemma model with a therapist personality profile.
-    Returns responses as an empathic mental health professional.
-    """
-    system_prompt = """You are Dr. Emily Hartman, a warm and experienced clinical psychologist.
+THERAPIST_SYSTEM_PROMPT = """You are Dr. Emily Hartman, a warm and experienced clinical psychologist.
     
     Respond to patients with:
     1. Emotional attunement ("I can sense how difficult this must be...")
@@ -22,36 +35,132 @@ def query_medgemma(prompt: str) -> str:
     - Mirror the user's language level
     - Always keep the conversation going by asking open ended questions to dive into the root cause of patients problem
     """
-    
-    try:
-        response = ollama.chat(
-            model='alibayram/medgemma:4b',
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            options={
-                'num_predict': 350,  # Slightly higher for structured responses
-                'temperature': 0.7,  # Balanced creativity/accuracy
-                'top_p': 0.9        # For diverse but relevant responses
-            }  # ← FIXED: Added missing closing brace
+
+MEDGEMMA_MODEL = 'alibayram/medgemma:4b'
+MEDGEMMA_OPTIONS = {
+    'num_predict': MEDGEMMA_MAX_TOKENS,  # Upper bound; generation_policy picks the budget per message
+    'temperature': 0.7,  # Balanced creativity/accuracy
+    'top_p': 0.9        # For diverse but relevant responses
+}
+MEDGEMMA_FALLBACK = "I'm having technical difficulties, but I want you to know your feelings matter. Please try again shortly."
+
+# Prompt prefix reuse: in "baked" mode the therapist prompt is built into a derived
+# model (like a Modelfile SYSTEM line), so every request starts with the same
+# prefix and Ollama can reuse its evaluated KV cache while the model stays loaded.
+# "inline" sends the system prompt with every request (the previous behaviour).
+# If the derived model cannot be created on a host, requests to that host go
+# inline for MEDGEMMA_BAKED_RETRY_SECONDS and creating it is then tried again.
+async def _baked_model_ready(endpoint) -> bool:
+    """Whether the endpoint can serve the baked model, creating it there on first use"""
+    if MEDGEMMA_PREFIX_MODE != "baked":
+        return False
+    if MEDGEMMA_BAKED_MODEL in endpoint.prepared:
+        return True
+
+    async with endpoint.setup_lock:
+        if MEDGEMMA_BAKED_MODEL in endpoint.prepared:
+            return True
+        if time.monotonic() < endpoint.setup_retry_at.get(MEDGEMMA_BAKED_MODEL, 0.0):
+            return False
+        try:
+            await endpoint.client.create(model=MEDGEMMA_BAKED_MODEL, from_=MEDGEMMA_MODEL, system=THERAPIST_SYSTEM_PROMPT)
+        except Exception as e:
+            logger.warning("Could not create %s on %s, sending the system prompt inline for %.0fs: %s",
+                           MEDGEMMA_BAKED_MODEL, endpoint.name, MEDGEMMA_BAKED_RETRY_SECONDS, e)
+            endpoint.setup_retry_at[MEDGEMMA_BAKED_MODEL] = time.monotonic() + MEDGEMMA_BAKED_RETRY_SECONDS
+            # Counts towards ejecting the host; a chat that then succeeds there clears it again
+            get_provider_pool().record_failure(endpoint, e)
+            return False
+        endpoint.prepared.add(MEDGEMMA_BAKED_MODEL)
+        endpoint.setup_retry_at.pop(MEDGEMMA_BAKED_MODEL, None)
+        return True
+
+
+def _medgemma_request(prompt: str, baked: bool) -> dict:
+    """Model and messages for the prefix mode"""
+    if baked:
+        return {
+            "model": MEDGEMMA_BAKED_MODEL,
+            "messages": [{"role": "user", "content": prompt}]
+        }
+    return {
+        "model": MEDGEMMA_MODEL,
+        "messages": [
+            {"role": "system", "content": THERAPIST_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+    }
+
+
+async def achat_medgemma(prompt: str, plan: Optional[GenerationPlan] = None):
+    """Raw async MedGemma chat response, including Ollama's eval counts and durations.
+
+    Requests are balanced across the Ollama hosts in the provider pool. With a
+    plan, its token budget and stop sequences are used and, if it has a soft
+    limit, the response is streamed and stopped early at a sentence boundary.
+    """
+    async def chat(endpoint):
+        baked = await _baked_model_ready(endpoint)
+
+        if plan is None:
+            return await endpoint.client.chat(
+                **_medgemma_request(prompt, baked),
+                options=MEDGEMMA_OPTIONS,
+                keep_alive=MEDGEMMA_KEEP_ALIVE
+            )
+
+        stream = plan.soft_limit is not None
+        response = await endpoint.client.chat(
+            **_medgemma_request(prompt, baked),
+            options=plan.options(MEDGEMMA_OPTIONS),
+            keep_alive=MEDGEMMA_KEEP_ALIVE,
+            stream=stream
         )
-        return response['message']['content'].strip()
+        return await collect_stream(response, plan) if stream else response
+
+    return await get_provider_pool().call(chat)
+
+
+async def aquery_medgemma(prompt: str) -> str:
+    """
+    Calls MedGemma with a therapist personality profile, without blocking the event loop.
+    Returns responses as an empathic mental health professional.
+    """
+    try:
+        policy = get_generation_policy()
+        plan = policy.plan(prompt)
+        response = await achat_medgemma(prompt, plan)
+        metrics = current_metrics()
+        if metrics:
+            metrics.add_ollama_response(response)
+
+        text = response['message']['content']
+        # A generation that ran out of budget ends mid-sentence; keep the complete sentences
+        answer = trim_to_sentence(text) if response.get('done_reason') == 'length' else text.strip()
+        policy.observe(plan, response, text, answer)
+        return answer
     except Exception as e:
-        print(f"Ollama error: {e}")  # Better error logging
-        return "I'm having technical difficulties, but I want you to know your feelings matter. Please try again shortly."
+        logger.error("Ollama error: %s", e)
+        return MEDGEMMA_FALLBACK
 
 # Step2: Setup Twilio calling API tool
-from twilio.rest import Client
 from config import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM_NUMBER, EMERGENCY_CONTACT
 
+@lru_cache(maxsize=1)
+def get_twilio_client():
+    """Twilio REST client, created on first use and reused afterwards"""
+    from twilio.rest import Client
+
+    return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+
 def call_emergency():
     """
     Places emergency call via Twilio API.
     Returns success/failure status.
     """
     try:
-        client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        client = get_twilio_client()
         
         call = client.calls.create(
             to=EMERGENCY_CONTACT,
@@ -59,9 +168,14 @@ def call_emergency():
             url="http://demo.twilio.com/docs/voice.xml"  # Can customize message
         )
         
-        print(f"Emergency call initiated. Call SID: {call.sid}")
+        logger.warning("Emergency call initiated", extra={"call_sid": call.sid})
         return f"Emergency call placed successfully. Call ID: {call.sid}"
         
     except Exception as e:
-        print(f"Emergency call failed: {e}")
+        logger.error("Emergency call failed: %s", e)
         return f"Emergency call failed: {str(e)}"
+
+
+async def acall_emergency():
+    """Async version of call_emergency; the blocking Twilio call runs in a thread"""
+    return await asyncio.to_thread(call_emergency)
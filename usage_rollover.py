@@ -0,0 +1,47 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from config import USAGE_ROLLOVER_CHECK_SECONDS
+from database import next_usage_rollover, rollover_usage_periods
+from shared_state import get_shared_store
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 300
+
+
+async def run_usage_rollover(check_seconds: int = USAGE_ROLLOVER_CHECK_SECONDS) -> None:
+    """Reset monthly usage for all users at each period boundary.
+
+    Runs once at startup to catch up on boundaries missed while the API was
+    down, then sleeps until the next month starts. Every worker runs this
+    loop; the lease makes one of them do the work, and because the reset is
+    idempotent the others only repeat a no-op if they run it afterwards.
+    """
+    store = get_shared_store()
+    next_run = datetime.utcnow()
+    while True:
+        now = datetime.utcnow()
+        if now >= next_run:
+            try:
+                if await asyncio.to_thread(store.acquire_lease, "usage-rollover", ttl=LEASE_SECONDS):
+                    reset = await asyncio.to_thread(rollover_usage_periods, now)
+                    if reset:
+                        logger.info("Reset monthly usage for %d users", reset)
+                    next_run = next_usage_rollover(now)
+                else:
+                    # Another worker holds the lease; check back once it would have expired
+                    next_run = now + timedelta(seconds=LEASE_SECONDS)
+            except Exception:
+                logger.exception("Monthly usage rollover failed")
+                next_run = now + timedelta(seconds=check_seconds)
+        # Wake up at least every check_seconds so clock jumps cannot delay the rollover much
+        await asyncio.sleep(max(1.0, min((next_run - datetime.utcnow()).total_seconds(), check_seconds)))
+
+
+def start_usage_rollover() -> asyncio.Task | None:
+    """Start the background usage rollover unless it is disabled (check interval of 0)"""
+    if USAGE_ROLLOVER_CHECK_SECONDS <= 0:
+        return None
+    return asyncio.create_task(run_usage_rollover())